@@ -5,4 +5,8 @@ pip install -r requirements.txt
 
 python manage.py collectstatic --no-input
 
-python manage.py migrate
\ No newline at end of file
+python manage.py migrate
+
+python manage.py build_snapshots
+
+python manage.py refresh_valuations --full
@@ -1,11 +1,75 @@
+import json
+
 from django.contrib import admin
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.urls import reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html
+from django.utils.text import smart_split, unescape_string_literal
+
+from .inventory import versioned_key
+from . import duplicates
+from .models import ArchivedCar, Car, CarImage, DuplicateCandidate, OutboundEmail, SavedSearch
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    On PostgreSQL, uses the planner's row estimate instead of COUNT(*) once
+    a changelist is past `exact_threshold` rows. Small results stay exact.
+    """
+    exact_threshold = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql':
+            sql, params = queryset.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+                plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            estimate = int(plan[0]['Plan']['Plan Rows'])
+            if estimate > self.exact_threshold:
+                return estimate
+        return super().count
 
 
-from .models import Car, CarImage
+class CachedAllValuesFieldListFilter(admin.AllValuesFieldListFilter):
+    """Caches the DISTINCT values of free-text filter fields per inventory version."""
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        super().__init__(field, request, params, model, model_admin, field_path)
+        key = versioned_key('admin-filter', model._meta.label_lower, field_path)
+        choices = cache.get(key)
+        if choices is None:
+            choices = list(self.lookup_choices)
+            cache.set(key, choices, 60 * 15)
+        self.lookup_choices = choices
+
 
 class CarImageInline(admin.TabularInline):
     model = CarImage
-    extra = 3
+    extra = 1
+    # Only the newest images are edited inline; the rest are reachable
+    # through the paginated CarImage changelist linked from the car form.
+    max_inline_images = 10
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        object_id = request.resolver_match.kwargs.get('object_id') if request.resolver_match else None
+        if not object_id:
+            return queryset
+        newest = (
+            queryset.filter(car_id=object_id)
+            .order_by('-created_at')
+            .values_list('id', flat=True)[:self.max_inline_images]
+        )
+        return queryset.filter(id__in=list(newest))
 
 @admin.register(Car)
 class CarAdmin(admin.ModelAdmin):
@@ -38,16 +102,25 @@ class CarAdmin(admin.ModelAdmin):
     ]
     list_filter = [
         'make', 'fuel_type', 'transmission', 'condition',
-        'is_featured', 'is_available', 'drive', 'body_style'
+        'is_featured', 'is_available',
+        ('drive', CachedAllValuesFieldListFilter),
+        ('body_style', CachedAllValuesFieldListFilter),
     ]
-    search_fields = ['title', 'make', 'model', 'description', 'primary_damage']
+    # Prefix matches can use an index; description and primary_damage are
+    # covered by full-text search on PostgreSQL (see get_search_results).
+    # Other databases don't search those two fields at all.
+    search_fields = ['^title', '^make', '^model']
     prepopulated_fields = {'slug': ('title',)}
     list_editable = ['is_featured', 'is_available']
     inlines = [CarImageInline]
+    readonly_fields = ['gallery']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
 
     fieldsets = (
         ('Basic Information', {
-            'fields': ('title', 'slug', 'description', 'price', 'main_image')
+            'fields': ('title', 'slug', 'description', 'price', 'main_image', 'gallery')
         }),
         ('Car Specifications', {
             'fields': (
@@ -64,8 +137,81 @@ class CarAdmin(admin.ModelAdmin):
         }),
     )
 
+    @admin.display(description='Gallery')
+    def gallery(self, obj):
+        if not obj.pk:
+            return '-'
+        url = reverse('admin:cars_carimage_changelist') + f'?car__id__exact={obj.pk}'
+        count = obj.additional_images.count()
+        return format_html('<a href="{}">{} image(s) - view all</a>', url, count)
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term or connections[queryset.db].vendor != 'postgresql':
+            return super().get_search_results(request, queryset, search_term)
+
+        # One query the planner can answer with a BitmapOr over the prefix
+        # and full-text indexes from migration 0013.
+        from django.contrib.postgres.search import SearchQuery, SearchVector
+        queryset = queryset.alias(
+            search_document=SearchVector('description', 'primary_damage', config='english'),
+        )
+        prefix_fields = [field.lstrip('^') for field in self.search_fields]
+        for bit in smart_split(search_term):
+            if bit.startswith(('"', "'")) and bit[0] == bit[-1]:
+                bit = unescape_string_literal(bit)
+            condition = Q(search_document=SearchQuery(bit, config='english'))
+            for field in prefix_fields:
+                condition |= Q(**{f'{field}__istartswith': bit})
+            queryset = queryset.filter(condition)
+        return queryset, False
+
 @admin.register(CarImage)
 class CarImageAdmin(admin.ModelAdmin):
     list_display = ['car', 'caption', 'created_at']
     list_filter = ['created_at']
+    list_select_related = ['car']
+    raw_id_fields = ['car']
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ['recipient', 'subject', 'kind', 'status', 'attempts', 'created_at', 'sent_at']
+    list_filter = ['status', 'kind']
+    search_fields = ['recipient']
+    readonly_fields = ['token', 'created_at', 'sent_at', 'last_error']
+
+
+@admin.register(ArchivedCar)
+class ArchivedCarAdmin(admin.ModelAdmin):
+    list_display = ['title', 'slug', 'make', 'model', 'year', 'price', 'archived_at']
+    search_fields = ['^slug', '^title']
+    readonly_fields = ['original_id', 'slug', 'title', 'make', 'model', 'year', 'price', 'data', 'archived_at']
+
+
+@admin.register(SavedSearch)
+class SavedSearchAdmin(admin.ModelAdmin):
+    list_display = ['__str__', 'email', 'make', 'min_price', 'max_price', 'is_active', 'last_notified_at']
+    list_filter = ['is_active', 'make']
+    search_fields = ['^email']
+    raw_id_fields = ['user']
+
+
+@admin.register(DuplicateCandidate)
+class DuplicateCandidateAdmin(admin.ModelAdmin):
+    list_display = ['cluster', 'car', 'other', 'text_similarity', 'image_distance', 'status', 'created_at']
+    list_filter = ['status']
+    list_select_related = ['car', 'other']
+    raw_id_fields = ['car', 'other']
+    readonly_fields = ['cluster', 'text_similarity', 'image_distance', 'created_at']
+    actions = ['mark_duplicate', 'mark_distinct']
+
+    @admin.action(description="Mark selected pairs as duplicates")
+    def mark_duplicate(self, request, queryset):
+        queryset.update(status='duplicate')
 
+    @admin.action(description="Mark selected pairs as not duplicates")
+    def mark_distinct(self, request, queryset):
+        car_ids = {car_id for pair in queryset.values_list('car_id', 'other_id') for car_id in pair}
+        queryset.update(status='distinct')
+        # Dismissed pairs no longer join clusters.
+        duplicates.relabel_clusters(car_ids)
@@ -0,0 +1,217 @@
+import math
+import threading
+import time
+from collections import defaultdict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+
+
+# Admission control for the unauthenticated endpoints that block on slow
+# outbound calls (Firebase, SMTP). Each route gets a token bucket (-> 429)
+# and a cap on in-flight requests (-> 503), so a burst can't tie up every
+# gunicorn worker.
+#
+# Configured through settings.CARS_ADMISSION:
+#     {
+#         'backend': 'memory' | 'cache',
+#         'cache_alias': 'default',
+#         'routes': {
+#             'firebase_login': {'rate': 5, 'burst': 10, 'concurrency': 2},
+#         },
+#     }
+# 'rate' is tokens per second. The default 'cache' backend shares state
+# (including the outcome counters behind stats()) between workers through a
+# Django cache, so it needs a shared one (REDIS_URL) with several workers.
+# 'memory' is per process and only suits a single threaded server such as
+# runserver: a sync gunicorn worker serves one request at a time, so its
+# own in-flight count never exceeds 1 and the 503 path never fires.
+
+
+OUTCOMES = ('admitted', 'throttled', 'shed')
+
+
+def _config():
+    return getattr(settings, 'CARS_ADMISSION', {})
+
+
+class MemoryStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._in_flight = defaultdict(int)
+        self._counters = defaultdict(lambda: defaultdict(int))
+
+    def take_token(self, key, rate, burst):
+        """Returns 0 if a token was taken, otherwise seconds until one is free."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, stamp = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - stamp) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return 0
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / rate
+
+    def acquire(self, key, limit):
+        with self._lock:
+            if self._in_flight[key] >= limit:
+                return False
+            self._in_flight[key] += 1
+            return True
+
+    def release(self, key):
+        with self._lock:
+            self._in_flight[key] = max(0, self._in_flight[key] - 1)
+
+    def in_flight(self, key):
+        return self._in_flight.get(key, 0)
+
+    def count(self, key, outcome):
+        with self._lock:
+            self._counters[key][outcome] += 1
+
+    def counts(self, key):
+        with self._lock:
+            return {outcome: self._counters[key][outcome] for outcome in OUTCOMES}
+
+
+class CacheStore:
+    """
+    Shares buckets, in-flight counts and outcome counters between workers
+    via a Django cache. The bucket update is read-modify-write, so it may
+    over-admit slightly under contention; the counters use atomic incr/decr.
+    """
+
+    timeout = 300
+
+    def __init__(self, alias='default'):
+        self.cache = caches[alias]
+
+    def take_token(self, key, rate, burst):
+        now = time.time()
+        cache_key = f'admission:bucket:{key}'
+        tokens, stamp = self.cache.get(cache_key, (burst, now))
+        tokens = min(burst, tokens + max(0, now - stamp) * rate)
+        if tokens >= 1:
+            self.cache.set(cache_key, (tokens - 1, now), self.timeout)
+            return 0
+        self.cache.set(cache_key, (tokens, now), self.timeout)
+        return (1 - tokens) / rate
+
+    def _incr(self, cache_key, timeout):
+        self.cache.add(cache_key, 0, timeout)
+        try:
+            count = self.cache.incr(cache_key)
+        except ValueError:
+            # Key expired between add() and incr().
+            self.cache.set(cache_key, 1, timeout)
+            count = 1
+        # The timeout only starts at add(); keep a busy key from expiring
+        # mid-request, which would let release() push it below zero.
+        self.cache.touch(cache_key, timeout)
+        return count
+
+    def acquire(self, key, limit):
+        if self._incr(f'admission:inflight:{key}', self.timeout) > limit:
+            self.release(key)
+            return False
+        return True
+
+    def release(self, key):
+        cache_key = f'admission:inflight:{key}'
+        try:
+            if self.cache.decr(cache_key) < 0:
+                # Expired and recreated while requests were in flight.
+                self.cache.set(cache_key, 0, self.timeout)
+        except ValueError:
+            pass
+
+    def in_flight(self, key):
+        return max(0, self.cache.get(f'admission:inflight:{key}', 0))
+
+    def count(self, key, outcome):
+        self._incr(f'admission:count:{key}:{outcome}', None)
+
+    def counts(self, key):
+        keys = {outcome: f'admission:count:{key}:{outcome}' for outcome in OUTCOMES}
+        values = self.cache.get_many(keys.values())
+        return {outcome: values.get(cache_key, 0) for outcome, cache_key in keys.items()}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            config = _config()
+            if config.get('backend', 'cache') == 'memory':
+                _store = MemoryStore()
+            else:
+                _store = CacheStore(config.get('cache_alias', 'default'))
+        return _store
+
+
+def reset():
+    """Drop the store (and with the memory backend its counters), e.g. after settings change."""
+    global _store
+    with _store_lock:
+        _store = None
+
+
+def stats():
+    store = get_store()
+    return {
+        route: {**store.counts(route), 'in_flight': store.in_flight(route)}
+        for route in _config().get('routes', {})
+    }
+
+
+def _reject(status, error, retry_after):
+    response = JsonResponse({'success': False, 'error': error}, status=status)
+    response['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def admission_control(route):
+    """
+    View decorator applying the CARS_ADMISSION policy for `route`. Apply it
+    outermost so rejected requests skip DRF, CSRF and body parsing.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            policy = _config().get('routes', {}).get(route)
+            if not policy:
+                return view(request, *args, **kwargs)
+
+            store = get_store()
+            rate = policy.get('rate')
+            if rate:
+                wait = store.take_token(route, rate, policy.get('burst', rate))
+                if wait:
+                    store.count(route, 'throttled')
+                    return _reject(429, 'Too many requests, try again shortly', wait)
+
+            limit = policy.get('concurrency')
+            if limit and not store.acquire(route, limit):
+                store.count(route, 'shed')
+                return _reject(503, 'Server busy, try again shortly', policy.get('retry_after', 1))
+
+            store.count(route, 'admitted')
+            try:
+                return view(request, *args, **kwargs)
+            finally:
+                if limit:
+                    store.release(route)
+
+        return wrapped
+
+    return decorator
@@ -0,0 +1,112 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import serializers
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedCar, Car
+
+
+class RestoreConflict(Exception):
+    pass
+
+
+def _config():
+    return getattr(settings, 'CARS_ARCHIVE', {})
+
+
+def archivable(after_days=None, cars=None):
+    """
+    Cars (of `cars`, default all) unavailable for longer than `after_days`.
+    updated_at stands in for "unavailable since": any edit to a hidden car
+    restarts its clock.
+    """
+    after_days = after_days if after_days is not None else _config().get('after_days', 90)
+    cutoff = timezone.now() - timedelta(days=after_days)
+    cars = cars if cars is not None else Car.objects.all()
+    return cars.filter(is_available=False, updated_at__lt=cutoff)
+
+
+def archive_batch(ids):
+    """Move one batch of cars (and their images) into ArchivedCar."""
+    with transaction.atomic():
+        cars = list(
+            Car.objects.select_for_update()
+            .filter(id__in=ids, is_available=False)
+            .prefetch_related('additional_images')
+        )
+        if not cars:
+            return 0
+        ArchivedCar.objects.bulk_create([
+            ArchivedCar(
+                original_id=car.id,
+                slug=car.slug,
+                title=car.title,
+                make=car.make,
+                model=car.model,
+                year=car.year,
+                price=car.price,
+                data={
+                    'car': serializers.serialize('python', [car])[0],
+                    'images': serializers.serialize('python', car.additional_images.all()),
+                },
+            )
+            for car in cars
+        ])
+        # Deleting through the ORM sends post_delete, so tombstones,
+        # snapshots and cached inventory data follow the archive.
+        Car.objects.filter(id__in=[car.id for car in cars]).delete()
+    return len(cars)
+
+
+def archive_cars(after_days=None, batch_size=None, limit=None, cars=None):
+    batch_size = batch_size or _config().get('batch_size', 500)
+    candidates = archivable(after_days, cars).order_by('id').values_list('id', flat=True)
+    archived = 0
+    last_id = 0
+    while limit is None or archived < limit:
+        size = batch_size if limit is None else min(batch_size, limit - archived)
+        ids = list(candidates.filter(id__gt=last_id)[:size])
+        if not ids:
+            break
+        last_id = ids[-1]
+        archived += archive_batch(ids)
+    return archived
+
+
+def restore_car(slug):
+    """
+    Move the most recently archived car with `slug` back into Car with its
+    original id and images. It comes back hidden (is_available=False), with
+    its archive clock restarted.
+    """
+    with transaction.atomic():
+        archived = ArchivedCar.objects.select_for_update().filter(slug=slug).latest('archived_at')
+        if Car.objects.filter(slug=slug).exists():
+            raise RestoreConflict(f"A live car already uses the slug '{slug}'")
+
+        objects = [archived.data['car'], *archived.data['images']]
+        for obj in serializers.deserialize('python', objects):
+            if isinstance(obj.object, Car):
+                # Raw saves keep the archived updated_at, which would make
+                # the (still hidden) car archivable again straight away.
+                obj.object.updated_at = timezone.now()
+            obj.save()
+        archived.delete()
+    return Car.objects.get(slug=slug)
+
+
+def archived_summary(slug):
+    """What CarDetailView returns (with 410) for a slug that was archived."""
+    archived = (
+        ArchivedCar.objects.filter(slug=slug)
+        .order_by('-archived_at')
+        .values('slug', 'title', 'make', 'model', 'year', 'price', 'archived_at')
+        .first()
+    )
+    if archived is not None:
+        archived['price'] = str(archived['price'])
+        archived['archived'] = True
+    return archived
+
@@ -0,0 +1,117 @@
+import random
+import statistics
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import connection, reset_queries, transaction
+from django.utils import timezone
+
+from .models import Car
+
+# Helpers for the bench_* management commands. Seeded data is created
+# inside rolled_back(), so benchmarks never leave rows behind.
+
+BODY_STYLES = ['Sedan', 'SUV', 'Hatchback', 'Coupe', 'Pickup', 'Van']
+DRIVES = ['FWD', 'RWD', 'AWD', '4WD']
+DAMAGES = ['Front end', 'Rear end', 'Side', 'Hail', 'Flood', 'Minor dents and scratches']
+MODELS = {
+    'toyota': ['Camry', 'Corolla', 'RAV4', 'Highlander'],
+    'honda': ['Civic', 'Accord', 'CR-V'],
+    'bmw': ['X5', '330i', 'M4'],
+    'ford': ['F-150', 'Escape', 'Mustang'],
+    'hyundai': ['Elantra', 'Tucson', 'Santa Fe'],
+    'kia': ['Sorento', 'Sportage', 'Optima'],
+    'lexus': ['RX 350', 'ES 350'],
+    'mercedes': ['C300', 'GLE 350'],
+    'nissan': ['Altima', 'Rogue'],
+    'jeep': ['Wrangler', 'Cherokee'],
+}
+
+
+@contextmanager
+def explicit_timestamps(model):
+    """Let bulk_create keep explicit created_at/updated_at values."""
+    fields = [f for f in model._meta.concrete_fields if getattr(f, 'auto_now', False) or getattr(f, 'auto_now_add', False)]
+    saved = [(f, f.auto_now, f.auto_now_add) for f in fields]
+    for f in fields:
+        f.auto_now = f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f, auto_now, auto_now_add in saved:
+            f.auto_now, f.auto_now_add = auto_now, auto_now_add
+
+
+@contextmanager
+def rolled_back():
+    """Run a block in a transaction that is always rolled back."""
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def seed_cars(count, batch_size=5000, seed=0, available_ratio=0.8, prefix='bench'):
+    """Bulk-insert `count` plausible cars; signals are not sent."""
+    rng = random.Random(seed)
+    now = timezone.now()
+    makes = list(MODELS)
+    fuels = [choice for choice, _ in Car.FUEL_CHOICES]
+    transmissions = [choice for choice, _ in Car.TRANSMISSION_CHOICES]
+    conditions = [choice for choice, _ in Car.CONDITION_CHOICES]
+    years = [choice for choice, _ in Car.CAR_YEAR]
+
+    batch = []
+    for i in range(count):
+        make = rng.choice(makes)
+        model = rng.choice(MODELS[make])
+        year = rng.choice(years)
+        mileage = rng.randint(1000, 250000)
+        stamp = now - timedelta(days=rng.uniform(0, 720))
+        batch.append(Car(
+            title=f"{year} {make.title()} {model}",
+            slug=f"{prefix}-{i}",
+            description=f"{year} {make} {model} with {mileage} km. {rng.choice(DAMAGES)} damage, runs and drives.",
+            price=rng.randint(2000, 90000),
+            main_image='cars/images/placeholder.jpg',
+            make=make,
+            model=model,
+            year=year,
+            mileage=mileage,
+            fuel_type=rng.choice(fuels),
+            transmission=rng.choice(transmissions),
+            condition=rng.choice(conditions),
+            color=rng.choice(['Black', 'White', 'Silver', 'Blue', 'Red']),
+            primary_damage=rng.choice(DAMAGES),
+            drive=rng.choice(DRIVES),
+            body_style=rng.choice(BODY_STYLES),
+            features='Bluetooth, Backup camera, Cruise control',
+            is_featured=rng.random() < 0.05,
+            is_available=rng.random() < available_ratio,
+            created_at=stamp,
+            updated_at=stamp,
+        ))
+        if len(batch) >= batch_size:
+            with explicit_timestamps(Car):
+                Car.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        with explicit_timestamps(Car):
+            Car.objects.bulk_create(batch)
+
+
+def measure(func, iterations):
+    """Returns (median ms, max ms, queries of the last run) for `func`."""
+    samples = []
+    force_debug = connection.force_debug_cursor
+    connection.force_debug_cursor = True
+    try:
+        for _ in range(iterations):
+            reset_queries()
+            start = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - start) * 1000)
+        queries = len(connection.queries)
+    finally:
+        connection.force_debug_cursor = force_debug
+    return statistics.median(samples), max(samples), queries
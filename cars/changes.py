@@ -0,0 +1,110 @@
+import base64
+import binascii
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Car, CarTombstone
+from .serializers import CarListSerializer
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+class TokenExpired(ValueError):
+    pass
+
+
+def _config():
+    return getattr(settings, 'CARS_CHANGE_FEED', {})
+
+
+def encode_token(moment, after_id=None):
+    """
+    A cursor at `moment`. With `after_id` it resumes after that car among
+    those updated at exactly `moment`.
+    """
+    value = moment.isoformat() if after_id is None else f"{moment.isoformat()}|{after_id}"
+    return base64.urlsafe_b64encode(value.encode()).decode().rstrip('=')
+
+
+def decode_token(token):
+    """(moment, after_id or None) of a token."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        value, _, after_id = base64.urlsafe_b64decode(padded).decode().partition('|')
+        moment = datetime.fromisoformat(value)
+        after_id = int(after_id) if after_id else None
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidToken(token)
+    if timezone.is_naive(moment):
+        raise InvalidToken(token)
+    return moment, after_id
+
+
+def changes_since(token=None):
+    """
+    Cars created, updated, hidden or deleted since `token` (everything
+    available when no token is given), plus the token for the next call.
+
+    The next token trails the current time by a grace period so rows
+    committed late by slower transactions are still picked up; clients
+    should treat entries as idempotent upserts/removals.
+    """
+    now = timezone.now()
+    limit = _config().get('limit', 500)
+    retention = timedelta(days=_config().get('tombstone_retention_days', 30))
+
+    if token is None:
+        since = None
+        cars = Car.objects.filter(is_available=True)
+    else:
+        since, after_id = decode_token(token)
+        if since < now - retention:
+            # Tombstones this old may already be pruned.
+            raise TokenExpired(token)
+        if after_id is None:
+            cars = Car.objects.filter(updated_at__gte=since)
+        else:
+            # Keyset on (updated_at, id), so pages move on even when more
+            # than `limit` cars share one timestamp.
+            # (The redundant >= gives the planner an index condition.)
+            cars = Car.objects.filter(Q(updated_at__gt=since) | Q(id__gt=after_id), updated_at__gte=since)
+
+    cars = list(cars.order_by('updated_at', 'id')[:limit + 1])
+    has_more = len(cars) > limit
+    cars = cars[:limit]
+
+    tombstones = []
+    if since is not None:
+        tombstones = list(CarTombstone.objects.filter(deleted_at__gte=since))
+
+    if has_more:
+        next_token = encode_token(cars[-1].updated_at, cars[-1].id)
+    else:
+        next_moment = now - timedelta(seconds=_config().get('grace_seconds', 5))
+        if since is not None:
+            next_moment = max(next_moment, since)
+        next_token = encode_token(next_moment)
+
+    return {
+        'changed': CarListSerializer([car for car in cars if car.is_available], many=True).data,
+        'removed': [
+            {'id': car.id, 'slug': car.slug, 'reason': 'hidden'}
+            for car in cars if not car.is_available
+        ] + [
+            {'id': tombstone.car_id, 'slug': tombstone.slug, 'reason': 'deleted'}
+            for tombstone in tombstones
+        ],
+        'has_more': has_more,
+        'next': next_token,
+    }
+
+
+def prune_tombstones():
+    retention = timedelta(days=_config().get('tombstone_retention_days', 30))
+    deleted, _ = CarTombstone.objects.filter(deleted_at__lt=timezone.now() - retention).delete()
+    return deleted
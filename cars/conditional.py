@@ -0,0 +1,92 @@
+import hashlib
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .models import Car, CarTombstone
+
+
+def removal_stamps():
+    """
+    When a car last left some filtered set: hiding or unfeaturing a car
+    saves it (moving the latest Car.updated_at), and deleting or archiving
+    it leaves a tombstone. Neither shows up in the set's own aggregates.
+    """
+    return [
+        Car.objects.aggregate(ts=Max('updated_at'))['ts'],
+        CarTombstone.objects.aggregate(ts=Max('deleted_at'))['ts'],
+    ]
+
+
+def inventory_validators(queryset, removals=True):
+    """
+    Compute (etag, last_modified) for a car queryset with one aggregate
+    query (plus removal_stamps() when `removals`), so a conditional GET
+    never has to render the response body.
+    """
+    stats = queryset.order_by().aggregate(
+        count=Count('id', distinct=True),
+        car_updated=Max('updated_at'),
+        images=Count('additional_images', distinct=True),
+        image_created=Max('additional_images__created_at'),
+    )
+    stamps = [stats['car_updated'], stats['image_created']] + (removal_stamps() if removals else [])
+    stamps = [ts for ts in stamps if ts]
+    last_modified = max(stamps) if stamps else None
+
+    # The counts catch deletions that don't move either timestamp.
+    raw = '{}:{}:{}:{}'.format(
+        stats['count'],
+        stats['images'],
+        stats['car_updated'].isoformat() if stats['car_updated'] else '',
+        stats['image_created'].isoformat() if stats['image_created'] else '',
+    )
+    etag = quote_etag(hashlib.sha1(raw.encode()).hexdigest())
+    return etag, last_modified
+
+
+class ConditionalGetMixin:
+    """
+    Adds strong ETag / Last-Modified validators and per-route Cache-Control
+    to the public car views. A matching If-None-Match or If-Modified-Since
+    returns 304 before the serializer runs.
+
+    Cache-Control policies come from settings.CARS_CACHE_CONTROL, keyed by
+    URL name (e.g. 'car-list'), with '*' as the fallback.
+    """
+
+    # Whether cars can leave the response while others stay; see
+    # removal_stamps(). Off for single-car routes, where removing the car
+    # empties the queryset and so changes both validators anyway.
+    track_removals = True
+
+    def get_conditional_queryset(self):
+        # Must be an unsliced queryset covering every car in the response.
+        return Car.objects.filter(is_available=True)
+
+    def get_cache_control(self):
+        policies = getattr(settings, 'CARS_CACHE_CONTROL', {})
+        url_name = getattr(self.request.resolver_match, 'url_name', None)
+        return policies.get(url_name, policies.get('*'))
+
+    def get(self, request, *args, **kwargs):
+        etag, last_modified = inventory_validators(self.get_conditional_queryset(), self.track_removals)
+        last_modified = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+
+        response.headers.setdefault('ETag', etag)
+        if last_modified and not response.has_header('Last-Modified'):
+            response.headers['Last-Modified'] = http_date(last_modified)
+
+        cache_control = self.get_cache_control()
+        if cache_control:
+            patch_cache_control(response, **cache_control)
+        return response
+
@@ -0,0 +1,336 @@
+import hashlib
+import io
+import logging
+import re
+import zlib
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+
+import numpy as np
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Car, DuplicateCandidate, ListingFingerprint, LshBucket
+
+try:
+    from PIL import Image
+except ImportError:  # optional: without Pillow only the text is compared
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Near-duplicate listings (the same car reposted under a slightly different
+# title).
+#
+# Text: word 3-shingles of title/description/features are MinHashed into
+# NUM_PERM values and split into BANDS bands of ROWS values. Each band is
+# stored as an LshBucket row, so candidates are found with one indexed
+# (band, bucket) lookup instead of comparing against every car. Two cars
+# with Jaccard similarity s share at least one band with probability
+# 1 - (1 - s**ROWS)**BANDS: about 60% at s = 0.6, over 99.9% at s = 0.85.
+#
+# Images: a 64-bit difference hash per image, split into IMAGE_CHUNKS
+# chunks of 21-22 bits stored the same way (multi-index hashing). Hashes
+# within Hamming distance d have at least one chunk within d // IMAGE_CHUNKS
+# bits of each other, so a lookup probes every value that close to each of
+# the car's chunks and the matches are verified on the full hash. Chunks
+# this wide keep buckets small; buckets with more than `max_bucket` members
+# (a blank or stock photo many listings share) are skipped altogether.
+#
+# Fingerprints are computed in a process pool by `manage.py find_duplicates`.
+# Changing a car's text or images drops its fingerprint so the next run
+# redoes it; other edits keep it (see fingerprint_source).
+
+NUM_PERM = 120
+BANDS = 20
+ROWS = NUM_PERM // BANDS
+IMAGE_CHUNKS = 3
+_CHUNK_BOUNDS = np.linspace(0, 64, IMAGE_CHUNKS + 1).astype(int).tolist()
+IMAGE_BAND_OFFSET = 100
+
+_rng = np.random.default_rng(20240901)
+_A = _rng.integers(1, 2 ** 63, NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_B = _rng.integers(0, 2 ** 63, NUM_PERM, dtype=np.uint64)
+
+
+def _config():
+    return getattr(settings, 'CARS_DUPLICATES', {})
+
+
+def shingles(text, size=3):
+    words = re.findall(r'\w+', text.lower())
+    if len(words) < size:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash(text):
+    """MinHash signature (NUM_PERM 32-bit ints) of `text`."""
+    hashed = np.fromiter(
+        (zlib.crc32(shingle.encode()) for shingle in shingles(text)), dtype=np.uint64
+    )
+    if not len(hashed):
+        return [0] * NUM_PERM
+    # Multiply-shift hashing; uint64 arithmetic wraps, which is intended.
+    with np.errstate(over='ignore'):
+        values = (hashed[:, None] * _A + _B) >> np.uint64(32)
+    return values.min(axis=0).astype(np.int64).tolist()
+
+
+def _bucket(values):
+    # Signed, to fit a BigIntegerField.
+    digest = hashlib.blake2b(repr(values).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+def _image_chunks(image_hash):
+    """(band, chunk value, chunk width in bits) of an image hash."""
+    for chunk, (start, end) in enumerate(zip(_CHUNK_BOUNDS, _CHUNK_BOUNDS[1:])):
+        yield IMAGE_BAND_OFFSET + chunk, (image_hash >> start) & ((1 << (end - start)) - 1), end - start
+
+
+def _image_distance_limit():
+    return _config().get('image_distance', IMAGE_CHUNKS - 1)
+
+
+def bands(signature, image_hashes):
+    """(band, bucket) pairs of a fingerprint."""
+    pairs = [(band, _bucket(signature[band * ROWS:(band + 1) * ROWS])) for band in range(BANDS)]
+    for image_hash in image_hashes:
+        pairs += [(band, value) for band, value, _ in _image_chunks(image_hash)]
+    return list(dict.fromkeys(pairs))
+
+
+def probes(signature, image_hashes):
+    """
+    (band, bucket) pairs to look up for a fingerprint: its own bands, plus
+    every image chunk value within the probe radius of its own.
+    """
+    radius = _image_distance_limit() // IMAGE_CHUNKS
+    pairs = bands(signature, [])
+    for image_hash in image_hashes:
+        for band, value, width in _image_chunks(image_hash):
+            for distance in range(radius + 1):
+                for bits in combinations(range(width), distance):
+                    pairs.append((band, value ^ sum(1 << bit for bit in bits)))
+    return list(dict.fromkeys(pairs))
+
+
+def dhash(data):
+    """64-bit difference hash of image bytes."""
+    with Image.open(io.BytesIO(data)) as image:
+        pixels = np.asarray(image.convert('L').resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    value = int(np.packbits(bits).view('>u8')[0])
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def hamming(a, b):
+    return ((a ^ b) & 0xFFFFFFFFFFFFFFFF).bit_count()
+
+
+def fingerprint_job(job):
+    """
+    Runs in the process pool: (car id, source, text, image urls) -> (car
+    id, source, signature, image hashes). Touches neither Django nor the
+    database.
+    """
+    car_id, source, text, urls, timeout = job
+    image_hashes = []
+    if Image is not None:
+        for url in urls:
+            try:
+                response = requests.get(url, timeout=timeout)
+                response.raise_for_status()
+                image_hashes.append(dhash(response.content))
+            except Exception as e:
+                logger.warning("Could not hash image %s of car %s: %s", url, car_id, e)
+    return car_id, source, minhash(text), image_hashes
+
+
+def _text(car):
+    return ' '.join([car.title, car.description, car.features or ''])
+
+
+def fingerprint_source(car):
+    """
+    Digest of the Car fields a fingerprint is computed from. Saving a car
+    only drops its fingerprint when this changes; gallery changes always do.
+    """
+    main_image = Car._meta.get_field('main_image').get_prep_value(car.main_image) or ''
+    return hashlib.blake2b(f"{_text(car)}\0{main_image}".encode(), digest_size=16).hexdigest()
+
+
+def _image_urls(car):
+    options = {'width': 64, 'height': 64, 'crop': 'fill', 'format': 'png', 'secure': True}
+    images = [car.main_image, *(image.image for image in car.additional_images.all())]
+    return [image.build_url(**options) for image in images[:_config().get('max_images', 4)] if image]
+
+
+def _jobs(cars):
+    timeout = _config().get('image_timeout', 5)
+    return [
+        (car.id, fingerprint_source(car), _text(car), _image_urls(car), timeout)
+        for car in cars
+    ]
+
+
+def compute_fingerprints(cars, workers=None):
+    jobs = _jobs(cars)
+    workers = workers if workers is not None else _config().get('workers', 4)
+    if workers <= 1 or len(jobs) <= 1:
+        return [fingerprint_job(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(fingerprint_job, jobs, chunksize=8))
+
+
+def _image_distance(a_hashes, b_hashes):
+    distances = [hamming(a, b) for a in a_hashes for b in b_hashes]
+    return min(distances) if distances else None
+
+
+def _chunks(items, size=2000):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def find_candidates(fingerprints):
+    """
+    {(car id, other car id): (text similarity, image distance)} for the cars
+    that look like duplicates of one of `fingerprints`. Only fingerprints
+    sharing an LSH bucket with them are loaded and compared.
+    """
+    wanted = {fingerprint.car_id: probes(fingerprint.minhash, fingerprint.image_hashes) for fingerprint in fingerprints}
+    members = defaultdict(set)
+    for chunk in _chunks({bucket for pairs in wanted.values() for _, bucket in pairs}):
+        rows = LshBucket.objects.filter(bucket__in=chunk).values_list('band', 'bucket', 'fingerprint_id')
+        for band, bucket, car_id in rows:
+            members[band, bucket].add(car_id)
+
+    max_bucket = _config().get('max_bucket', 1000)
+    oversized = {pair for pair, car_ids in members.items() if len(car_ids) > max_bucket}
+    if oversized:
+        logger.info("Skipping %d LSH buckets with more than %d cars", len(oversized), max_bucket)
+
+    signatures = {fingerprint.car_id: (fingerprint.minhash, fingerprint.image_hashes) for fingerprint in fingerprints}
+    candidates = {
+        car_id: set().union(*(members[pair] for pair in pairs if pair in members and pair not in oversized)) - {car_id}
+        for car_id, pairs in wanted.items()
+    }
+    for chunk in _chunks(set().union(*candidates.values()) - signatures.keys()):
+        rows = ListingFingerprint.objects.filter(car_id__in=chunk).values_list('car_id', 'minhash', 'image_hashes')
+        for car_id, signature, image_hashes in rows:
+            signatures[car_id] = (signature, image_hashes)
+
+    threshold = _config().get('text_threshold', 0.6)
+    max_distance = _image_distance_limit()
+    row_of = {car_id: row for row, car_id in enumerate(signatures)}
+    matrix = np.array([signature for signature, _ in signatures.values()], dtype=np.int64).reshape(-1, NUM_PERM)
+    found = {}
+    for car_id, others in candidates.items():
+        others = [other_id for other_id in others if other_id in row_of]
+        if not others:
+            continue
+        # One vectorized comparison against every candidate of this car.
+        similarities = (matrix[[row_of[other_id] for other_id in others]] == matrix[row_of[car_id]]).mean(axis=1)
+        image_hashes = signatures[car_id][1]
+        for other_id, text_similarity in zip(others, similarities.tolist()):
+            pair = (min(car_id, other_id), max(car_id, other_id))
+            if pair in found:
+                continue
+            image_distance = _image_distance(image_hashes, signatures[other_id][1])
+            if text_similarity >= threshold or (image_distance is not None and image_distance <= max_distance):
+                found[pair] = (text_similarity, image_distance)
+    return found
+
+
+def relabel_clusters(car_ids):
+    """Label every non-dismissed candidate with the lowest car id connected to it."""
+    touching = DuplicateCandidate.objects.filter(Q(car_id__in=car_ids) | Q(other_id__in=car_ids))
+    labels = set(touching.values_list('cluster', flat=True))
+    candidates = list(
+        DuplicateCandidate.objects.exclude(status='distinct')
+        .filter(Q(cluster__in=labels) | Q(car_id__in=car_ids) | Q(other_id__in=car_ids))
+    )
+    parent = {}
+
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for candidate in candidates:
+        a, b = find(candidate.car_id), find(candidate.other_id)
+        if a != b:
+            parent[max(a, b)] = min(a, b)
+    changed = []
+    for candidate in candidates:
+        cluster = find(candidate.car_id)
+        if candidate.cluster != cluster:
+            candidate.cluster = cluster
+            changed.append(candidate)
+    DuplicateCandidate.objects.bulk_update(changed, ['cluster'])
+
+
+def save_fingerprints(results):
+    """Stores fingerprints and records the candidates they find. Returns the pairs found."""
+    with transaction.atomic():
+        ids = [car_id for car_id, _, _, _ in results]
+        ListingFingerprint.objects.filter(car_id__in=ids).delete()
+        # A car deleted since it was loaded has nothing to fingerprint, and
+        # one edited since is left stale for the next run.
+        current = {
+            car.id: fingerprint_source(car)
+            for car in Car.objects.filter(id__in=ids).only('id', 'title', 'description', 'features', 'main_image')
+        }
+        fingerprints = ListingFingerprint.objects.bulk_create([
+            ListingFingerprint(car_id=car_id, source=source, minhash=signature, image_hashes=image_hashes)
+            for car_id, source, signature, image_hashes in results if current.get(car_id) == source
+        ])
+        existing = [fingerprint.car_id for fingerprint in fingerprints]
+        LshBucket.objects.bulk_create([
+            LshBucket(fingerprint_id=fingerprint.car_id, band=band, bucket=bucket)
+            for fingerprint in fingerprints
+            for band, bucket in bands(fingerprint.minhash, fingerprint.image_hashes)
+        ], batch_size=5000)
+
+        found = find_candidates(fingerprints)
+        candidates = [
+            DuplicateCandidate(
+                car_id=car_id, other_id=other_id, cluster=car_id,
+                text_similarity=round(text_similarity, 3), image_distance=image_distance,
+            )
+            for (car_id, other_id), (text_similarity, image_distance) in found.items()
+        ]
+        # Pairs already on record keep their review status.
+        DuplicateCandidate.objects.bulk_create(candidates, batch_size=2000, ignore_conflicts=True)
+        if found:
+            relabel_clusters(existing)
+    return len(found)
+
+
+def stale_cars():
+    return Car.objects.filter(fingerprint__isnull=True)
+
+
+def process_stale(batch_size=None, workers=None):
+    """Fingerprints one batch of new or changed cars. Returns (cars, candidate pairs)."""
+    batch_size = batch_size or _config().get('batch_size', 200)
+    cars = list(stale_cars().order_by('id').prefetch_related('additional_images')[:batch_size])
+    if not cars:
+        return 0, 0
+    return len(cars), save_fingerprints(compute_fingerprints(cars, workers))
+
+
+def pending_clusters():
+    """{cluster: [candidates]} of everything still awaiting review."""
+    clusters = {}
+    for candidate in DuplicateCandidate.objects.filter(status='pending').select_related('car', 'other'):
+        clusters.setdefault(candidate.cluster, []).append(candidate)
+    return clusters
@@ -0,0 +1,90 @@
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from .inventory import versioned_key
+from .models import Car
+
+# Facet field -> choices used for labels (None: free-text field).
+FACETS = {
+    'make': dict(Car.CAR_BRAND),
+    'fuel_type': dict(Car.FUEL_CHOICES),
+    'transmission': dict(Car.TRANSMISSION_CHOICES),
+    'body_style': None,
+    'year': dict(Car.CAR_YEAR),
+}
+
+CACHE_TIMEOUT = 60 * 15
+
+
+def facet_combinations():
+    """
+    Counts of available cars per distinct combination of facet values.
+    One GROUP BY covers every facet; the result is small (bounded by the
+    product of choice lists actually in stock) and is cached per inventory
+    version, so any filter selection can be answered from it in Python.
+    """
+    key = versioned_key('facet-combinations')
+    rows = cache.get(key)
+    if rows is None:
+        rows = [
+            (tuple(row[field] for field in FACETS), row['count'])
+            for row in (
+                Car.objects.filter(is_available=True)
+                .order_by()
+                .values(*FACETS)
+                .annotate(count=Count('id'))
+            )
+        ]
+        cache.set(key, rows, CACHE_TIMEOUT)
+    return rows
+
+
+def parse_selection(params):
+    """{'make': 'bmw,audi'} -> {'make': {'bmw', 'audi'}}, ignoring unknown keys."""
+    selection = {}
+    for field in FACETS:
+        raw = params.get(field)
+        if raw:
+            values = {value.strip() for value in raw.split(',') if value.strip()}
+            if values:
+                selection[field] = values
+    return selection
+
+
+def facet_counts(selection):
+    """
+    Disjunctive facet counts: each facet is counted with every *other*
+    facet's selection applied, so picking one make still shows the counts
+    for the remaining makes.
+    """
+    fields = list(FACETS)
+    counts = {field: defaultdict(int) for field in fields}
+    total = 0
+
+    for values, count in facet_combinations():
+        misses = [
+            field for field, value in zip(fields, values)
+            if field in selection and value not in selection[field]
+        ]
+        if not misses:
+            total += count
+        if len(misses) > 1:
+            continue
+        for field, value in zip(fields, values):
+            if value and (not misses or misses == [field]):
+                counts[field][value] += count
+
+    result = {'total': total}
+    for field, labels in FACETS.items():
+        result[field] = [
+            {
+                'value': value,
+                'label': labels.get(value, value) if labels else value,
+                'count': count,
+                'selected': value in selection.get(field, ()),
+            }
+            for value, count in sorted(counts[field].items(), key=lambda item: (-item[1], item[0]))
+        ]
+    return result
@@ -0,0 +1,54 @@
+from collections import Counter
+
+from django.core.cache import cache
+from django.db.models import Q
+
+from .facets import FACETS, facet_combinations
+from .inventory import versioned_key
+from .models import Car
+from .serializers import CarListSerializer
+
+RECENT_COUNT = 8
+CACHE_TIMEOUT = 60 * 15
+
+
+def make_counts():
+    # Reuses the cached facet rows, so this is usually free.
+    make_index = list(FACETS).index('make')
+    counts = Counter()
+    for values, count in facet_combinations():
+        counts[values[make_index]] += count
+    labels = FACETS['make']
+    return [
+        {'make': make, 'label': labels.get(make, make), 'count': count}
+        for make, count in counts.most_common()
+    ]
+
+
+def build_home_payload():
+    """
+    Recent, featured and per-make counts for the landing page. Recent and
+    featured cars are loaded in one query and each car is serialized once;
+    the sections refer to them by id.
+    """
+    available = Car.objects.filter(is_available=True)
+    recent_ids = available.values('id')[:RECENT_COUNT]
+    cars = list(available.filter(Q(id__in=recent_ids) | Q(is_featured=True)))
+
+    # Everything that isn't one of the newest RECENT_COUNT cars is featured
+    # and older, so under the -created_at ordering the newest cars come first.
+    return {
+        'cars': CarListSerializer(cars, many=True).data,
+        'recent': [car.id for car in cars[:RECENT_COUNT]],
+        'featured': [car.id for car in cars if car.is_featured],
+        'makes': make_counts(),
+    }
+
+
+def home_payload():
+    key = versioned_key('home')
+    payload = cache.get(key)
+    if payload is None:
+        payload = build_home_payload()
+        cache.set(key, payload, CACHE_TIMEOUT)
+    return payload
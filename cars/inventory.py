@@ -0,0 +1,36 @@
+import time
+
+from django.core.cache import cache
+
+# A counter bumped whenever any car or car image changes (see signals.py).
+# Derived data (facets, home page, ...) is cached under the current version,
+# so a bump invalidates all of it without tracking individual keys.
+
+VERSION_KEY = 'cars:inventory-version'
+
+
+def _fresh_version():
+    # Millisecond clock so a version lost to eviction or a cache restart
+    # never collides with one handed out before.
+    return int(time.time() * 1000)
+
+
+def inventory_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, _fresh_version(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_inventory_version():
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        version = _fresh_version()
+        cache.set(VERSION_KEY, version, None)
+        return version
+
+
+def versioned_key(name, *parts):
+    return ':'.join(['cars', name, str(inventory_version()), *map(str, parts)])
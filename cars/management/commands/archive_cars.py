@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from cars import archive, changes, snapshots
+from cars.models import ArchivedCar
+
+
+class Command(BaseCommand):
+    help = "Move cars that have been unavailable for a while into the archive table, or restore them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--after-days', type=int, default=None, help="Archive cars unavailable for longer than this (default: CARS_ARCHIVE['after_days']).")
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--limit', type=int, default=None, help="Stop after archiving this many cars.")
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument('--restore', nargs='+', metavar='SLUG', help="Restore these archived cars instead of archiving. They come back hidden (is_available=False).")
+
+    def handle(self, *args, **options):
+        if options['restore']:
+            for slug in options['restore']:
+                try:
+                    car = archive.restore_car(slug)
+                except ArchivedCar.DoesNotExist:
+                    raise CommandError(f"No archived car with slug '{slug}'")
+                except archive.RestoreConflict as e:
+                    raise CommandError(str(e))
+                self.stdout.write(f"Restored {car.slug} (id {car.id}, hidden until made available)")
+            snapshots.flush_pending()
+            return
+
+        if options['dry_run']:
+            count = archive.archivable(options['after_days']).count()
+            self.stdout.write(f"{count} cars would be archived")
+            return
+
+        count = archive.archive_cars(options['after_days'], options['batch_size'], options['limit'])
+        self.stdout.write(f"Archived {count} cars")
+        snapshots.flush_pending()
+
+        # Same schedule suits the change feed's tombstone retention.
+        pruned = changes.prune_tombstones()
+        if pruned:
+            self.stdout.write(f"Pruned {pruned} expired tombstones")
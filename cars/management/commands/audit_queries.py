@@ -0,0 +1,57 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from cars import query_audit
+from cars.benchmarks import rolled_back, seed_cars
+
+
+class Command(BaseCommand):
+    help = (
+        "Request every cars API route against a seeded dataset (rolled back afterwards), "
+        "EXPLAIN the SQL and flag sequential scans and sorts, proposing indexes for them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000)
+        parser.add_argument('--sql', action='store_true', help="Print the full SQL of flagged queries.")
+        parser.add_argument('--check', action='store_true', help="Exit with an error if any index is proposed.")
+
+    def handle(self, *args, **options):
+        if connection.vendor not in query_audit.EXPLAINERS:
+            raise CommandError(
+                f"Can't read query plans on {connection.vendor}; "
+                f"supported: {', '.join(query_audit.EXPLAINERS)}"
+            )
+        with rolled_back():
+            seed_cars(options['rows'])
+            user = User.objects.create(username='audit-queries', email='audit@example.com', is_staff=True)
+            results = query_audit.exercise_routes(user, query_audit.sample_objects(user))
+            flagged = query_audit.audit(results)
+            proposals = query_audit.propose_indexes(flagged)
+
+        self.stdout.write(f"{options['rows']} cars on {connection.vendor}\n")
+        if connection.vendor == 'sqlite':
+            self.stdout.write("  (SQLite can't use indexes for boolean filters; see cars/query_audit.py)\n")
+        for path, status, captured in results:
+            issues = {issue for (alias, sql), query in flagged.items() if path in query['paths'] for issue in query['issues']}
+            summary = ', '.join(f"{kind} {table}" for kind, table in sorted(issues, key=str)) or '-'
+            self.stdout.write(f"  {path:<48} {str(status):<16} {len(captured):3d} queries  {summary}")
+
+        if flagged:
+            self.stdout.write(f"\n{len(flagged)} flagged queries:")
+            for (alias, sql), query in flagged.items():
+                issues = ', '.join(f"{kind} {table}" for kind, table in query['issues'])
+                self.stdout.write(f"  [{alias}] {issues}  <- {', '.join(query['paths'])}")
+                self.stdout.write(f"    {sql if options['sql'] else sql[:160] + ('...' if len(sql) > 160 else '')}")
+
+        if not proposals:
+            self.stdout.write("\nNo indexes to propose.")
+            return
+        self.stdout.write("\nProposed indexes (add to Meta.indexes, then makemigrations):")
+        for model, indexes in proposals.items():
+            self.stdout.write(f"  {model.__name__}:")
+            for fields in indexes:
+                self.stdout.write(f"    models.Index(fields={fields!r}),")
+        if options['check']:
+            raise CommandError("Some queries have no index to use")
@@ -0,0 +1,75 @@
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db import connection
+from django.test import Client
+
+from cars.benchmarks import measure, rolled_back, seed_cars
+from cars.models import Car
+
+URLS = [
+    '/admin/cars/car/',
+    '/admin/cars/car/?q=camry',
+    '/admin/cars/car/?q=flood',
+    '/admin/cars/car/?make__exact=toyota&is_available__exact=1',
+    '/admin/cars/car/?body_style=SUV',
+]
+
+# CarAdmin settings before the changelist was tuned, for comparison. The
+# legacy admin showed 100 rows per page; both runs use the current
+# list_per_page so only the query changes are measured.
+LEGACY = {
+    'search_fields': ['title', 'make', 'model', 'description', 'primary_damage'],
+    'list_filter': [
+        'make', 'fuel_type', 'transmission', 'condition',
+        'is_featured', 'is_available', 'drive', 'body_style'
+    ],
+    'paginator': Paginator,
+    'show_full_result_count': True,
+}
+
+
+class Command(BaseCommand):
+    help = "Time CarAdmin changelist pages against a seeded inventory (rolled back afterwards)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--iterations', type=int, default=5)
+        parser.add_argument('--no-compare', action='store_true', help="Skip the run with the legacy CarAdmin settings.")
+
+    def _run(self, client, label, iterations):
+        self.stdout.write(label)
+        for url in URLS:
+            cache.clear()
+            median, worst, queries = measure(lambda: self._get(client, url), iterations)
+            self.stdout.write(f"  {url:<60} median {median:8.1f}ms  max {worst:8.1f}ms  {queries} queries")
+
+    def _get(self, client, url):
+        response = client.get(url, HTTP_HOST='localhost')
+        assert response.status_code == 200, (url, response.status_code)
+
+    def handle(self, *args, **options):
+        car_admin = admin.site._registry[Car]
+        with rolled_back():
+            seed_cars(options['rows'])
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(f'ANALYZE {Car._meta.db_table}')
+            user = User.objects.create_superuser('bench-admin', 'bench@example.com', 'bench')
+            client = Client()
+            client.force_login(user)
+
+            self.stdout.write(f"{options['rows']} cars on {connection.vendor}")
+            self._run(client, "Current CarAdmin", options['iterations'])
+
+            if not options['no_compare']:
+                current = {name: getattr(car_admin, name) for name in LEGACY}
+                try:
+                    for name, value in LEGACY.items():
+                        setattr(car_admin, name, value)
+                    self._run(client, "Legacy CarAdmin settings", options['iterations'])
+                finally:
+                    for name, value in current.items():
+                        setattr(car_admin, name, value)
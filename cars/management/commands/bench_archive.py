@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import override_settings
+
+from cars import archive
+from cars.benchmarks import measure, seed_cars
+from cars.models import ArchivedCar, Car, CarTombstone
+
+PREFIX = 'bench-archive'
+
+# The hot-path queries behind the public views.
+QUERIES = {
+    'list page (50)': lambda: list(Car.objects.filter(is_available=True)[:50]),
+    'available count': lambda: Car.objects.filter(is_available=True).count(),
+    'featured': lambda: list(Car.objects.filter(is_available=True, is_featured=True)),
+    'related (make)': lambda: list(Car.objects.filter(make='toyota', is_available=True)[:4]),
+    'detail (slug)': lambda: Car.objects.filter(slug=f'{PREFIX}-1', is_available=True).first(),
+    'facet group by': lambda: list(
+        Car.objects.filter(is_available=True).order_by()
+        .values('make', 'fuel_type', 'transmission', 'body_style', 'year').annotate(count=Count('id'))
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure hot-table query latency before and after archiving. Seeds "
+        f"'{PREFIX}-*' cars, archives them and deletes everything it created."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--available-ratio', type=float, default=0.4)
+        parser.add_argument('--iterations', type=int, default=10)
+
+    def _report(self, label, iterations):
+        self.stdout.write(f"{label}: {Car.objects.count()} rows in {Car._meta.db_table}")
+        for name, query in QUERIES.items():
+            median, worst, _ = measure(query, iterations)
+            self.stdout.write(f"  {name:<18} median {median:8.2f}ms  max {worst:8.2f}ms")
+
+    def _vacuum(self):
+        # VACUUM FULL stands in for the steady state where freed pages have
+        # been reused instead of the table growing.
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'VACUUM FULL ANALYZE {Car._meta.db_table}')
+        elif connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('VACUUM')
+                cursor.execute('ANALYZE')
+
+    def handle(self, *args, **options):
+        seed_cars(options['rows'], available_ratio=options['available_ratio'], prefix=PREFIX)
+        try:
+            self._vacuum()
+            self._report("Before archiving", options['iterations'])
+
+            # Not rolled back like the other benchmarks, since VACUUM can't
+            # run in a transaction, so only the seeded cars may be archived.
+            with override_settings(CARS_SNAPSHOTS={'enabled': False}):
+                archived = archive.archive_cars(
+                    after_days=90, batch_size=1000, cars=Car.objects.filter(slug__startswith=f'{PREFIX}-'),
+                )
+            self._vacuum()
+            self.stdout.write(f"Archived {archived} cars")
+            self._report("After archiving", options['iterations'])
+        finally:
+            Car.objects.filter(slug__startswith=f'{PREFIX}-').delete()
+            ArchivedCar.objects.filter(slug__startswith=f'{PREFIX}-').delete()
+            CarTombstone.objects.filter(slug__startswith=f'{PREFIX}-').delete()
@@ -0,0 +1,78 @@
+import random
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from cars import duplicates
+from cars.benchmarks import rolled_back, seed_cars
+from cars.models import Car, DuplicateCandidate, ListingFingerprint, LshBucket
+
+WORDS = [
+    'clean', 'title', 'low', 'mileage', 'leather', 'seats', 'sunroof', 'camera', 'navigation', 'alloy',
+    'wheels', 'service', 'history', 'one', 'owner', 'accident', 'free', 'new', 'tyres', 'brakes',
+    'battery', 'engine', 'smooth', 'gearbox', 'cold', 'air', 'condition', 'keyless', 'entry', 'push',
+    'start', 'bluetooth', 'cruise', 'control', 'heated', 'mirrors', 'tinted', 'windows', 'roof', 'rack',
+    'tow', 'bar', 'spare', 'key', 'minor', 'dent', 'scratch', 'bumper', 'door', 'fender',
+    'repainted', 'original', 'paint', 'imported', 'duty', 'paid', 'registered', 'foreign', 'used', 'reliable',
+]
+
+
+class Command(BaseCommand):
+    help = "Time duplicate detection on a seeded inventory with planted reposts (rolled back afterwards)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20000)
+        parser.add_argument('--reposts', type=float, default=0.01, help="Share of cars that are edited copies of another.")
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--images', action='store_true', help="Also fetch and hash images (needs network access).")
+
+    def _texts(self, rng, reposts):
+        cars = list(Car.objects.order_by('id').only('id', 'title'))
+        planted = set()
+        for i, car in enumerate(cars):
+            if i and rng.random() < reposts:
+                original = cars[rng.randrange(i)]
+                words = original.description.split()
+                for _ in range(2):
+                    words[rng.randrange(len(words))] = rng.choice(WORDS)
+                car.title = original.title + ' ' + rng.choice(['!!', 'for sale', 'cheap', 'urgent'])
+                car.description = ' '.join(words)
+                planted.add((original.id, car.id))
+            else:
+                car.description = ' '.join(rng.choice(WORDS) for _ in range(40))
+        Car.objects.bulk_update(cars, ['title', 'description'], batch_size=2000)
+        return planted
+
+    def handle(self, *args, **options):
+        if not options['images']:
+            duplicates.Image = None
+        rng = random.Random(0)
+        with rolled_back():
+            ListingFingerprint.objects.all().delete()
+            seed_cars(options['rows'])
+            planted = self._texts(rng, options['reposts'])
+            self.stdout.write(f"{options['rows']} cars ({len(planted)} reposts) on {connection.vendor}")
+
+            start = time.perf_counter()
+            while duplicates.process_stale(options['batch_size'], options['workers'])[0]:
+                pass
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f"  fingerprinted in {elapsed:.1f}s, {LshBucket.objects.count()} LSH buckets")
+
+            found = set(DuplicateCandidate.objects.values_list('car_id', 'other_id'))
+            recalled = len(planted & found)
+            self.stdout.write(f"  {len(found)} candidate pairs, {recalled}/{len(planted)} reposts found")
+
+            # One lookup through the LSH index against comparing with every car.
+            fingerprint = ListingFingerprint.objects.order_by('-car_id').first()
+            start = time.perf_counter()
+            duplicates.find_candidates([fingerprint])
+            indexed = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            signatures = np.array(list(ListingFingerprint.objects.values_list('minhash', flat=True)), dtype=np.int64)
+            (signatures == np.array(fingerprint.minhash)).mean(axis=1)
+            linear = (time.perf_counter() - start) * 1000
+            self.stdout.write(f"  one lookup: LSH {indexed:.1f}ms, full scan {linear:.1f}ms")
@@ -0,0 +1,41 @@
+import statistics
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+SEPARATE_CALLS = ['/api/cars/recent/', '/api/cars/featured/', '/api/cars/facets/']
+
+
+class Command(BaseCommand):
+    help = "Compare time to first byte of /api/home/ against the separate landing-page calls."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--host', default='localhost')
+
+    def _time(self, client, urls, cold):
+        samples = []
+        for _ in range(self.iterations):
+            if cold:
+                cache.clear()
+            start = time.perf_counter()
+            for url in urls:
+                response = client.get(url, HTTP_HOST=self.host)
+                assert response.status_code == 200, (url, response.status_code)
+            samples.append((time.perf_counter() - start) * 1000)
+        return statistics.median(samples), max(samples)
+
+    def handle(self, *args, **options):
+        self.iterations = options['iterations']
+        self.host = options['host']
+        client = Client()
+
+        for label, cold in (('cold cache', True), ('warm cache', False)):
+            home = self._time(client, ['/api/home/'], cold)
+            separate = self._time(client, SEPARATE_CALLS, cold)
+            self.stdout.write(
+                f"{label}: /api/home/ median {home[0]:.2f}ms (max {home[1]:.2f}ms); "
+                f"3 separate calls median {separate[0]:.2f}ms (max {separate[1]:.2f}ms)"
+            )
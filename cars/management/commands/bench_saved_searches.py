@@ -0,0 +1,93 @@
+import math
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from cars.benchmarks import BODY_STYLES, MODELS
+from cars.models import Car
+from cars.saved_searches import SavedSearchIndex, SearchSpec
+
+
+def _matches_linear(spec, categories, price, year):
+    if any(wanted is not None and wanted != value for wanted, value in zip(spec[1:5], categories)):
+        return False
+    if not spec.min_price <= price <= spec.max_price:
+        return False
+    return spec.min_year <= year <= spec.max_year
+
+
+class Command(BaseCommand):
+    help = "Time matching new cars against saved searches with the index and with a linear scan."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--searches', type=int, default=100000)
+        parser.add_argument('--cars', type=int, default=500)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--no-compare', action='store_true', help="Skip the linear-scan baseline.")
+
+    def _specs(self, rng, count):
+        makes = list(MODELS)
+        fuels = [choice for choice, _ in Car.FUEL_CHOICES]
+        transmissions = [choice for choice, _ in Car.TRANSMISSION_CHOICES]
+        styles = [style.lower() for style in BODY_STYLES]
+        specs = []
+        for i in range(count):
+            # Most buyers pick a make and a budget; fewer narrow further.
+            low = rng.choice([-math.inf, rng.randint(1, 60) * 1000])
+            high = rng.choice([math.inf, (low if math.isfinite(low) else 0) + rng.randint(5, 40) * 1000])
+            min_year = rng.choice([-math.inf, rng.randint(2005, 2022)])
+            specs.append(SearchSpec(
+                i,
+                rng.choice(makes) if rng.random() < 0.8 else None,
+                rng.choice(fuels) if rng.random() < 0.3 else None,
+                rng.choice(transmissions) if rng.random() < 0.3 else None,
+                rng.choice(styles) if rng.random() < 0.3 else None,
+                low, high, min_year, math.inf,
+            ))
+        return specs
+
+    def _cars(self, rng, count):
+        fuels = [choice for choice, _ in Car.FUEL_CHOICES]
+        transmissions = [choice for choice, _ in Car.TRANSMISSION_CHOICES]
+        return [
+            (
+                (rng.choice(list(MODELS)), rng.choice(fuels), rng.choice(transmissions), rng.choice(BODY_STYLES).lower()),
+                float(rng.randint(2000, 90000)),
+                float(rng.randint(2005, 2024)),
+            )
+            for _ in range(count)
+        ]
+
+    def _time(self, func, cars):
+        samples = []
+        results = []
+        for car in cars:
+            start = time.perf_counter()
+            results.append(sorted(func(*car)))
+            samples.append((time.perf_counter() - start) * 1000)
+        return results, statistics.median(samples), max(samples)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        specs = self._specs(rng, options['searches'])
+        cars = self._cars(rng, options['cars'])
+
+        start = time.perf_counter()
+        index = SavedSearchIndex(specs)
+        build_ms = (time.perf_counter() - start) * 1000
+        self.stdout.write(f"{len(specs)} saved searches in {len(index.groups)} groups, index built in {build_ms:.0f}ms")
+
+        indexed, median, worst = self._time(index.match, cars)
+        hits = statistics.mean(len(result) for result in indexed)
+        self.stdout.write(f"  indexed  median {median:8.3f}ms  max {worst:8.3f}ms  ({hits:.0f} matches per car)")
+
+        if not options['no_compare']:
+            linear = lambda categories, price, year: [
+                spec.id for spec in specs if _matches_linear(spec, categories, price, year)
+            ]
+            scanned, median, worst = self._time(linear, cars[:50])
+            self.stdout.write(f"  linear   median {median:8.3f}ms  max {worst:8.3f}ms  (first {len(scanned)} cars)")
+            if scanned != indexed[:len(scanned)]:
+                self.stderr.write("Indexed and linear matches differ!")
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+
+from cars import valuation
+from cars.benchmarks import measure, rolled_back, seed_cars
+from cars.models import PendingValuation, PriceSegment
+
+
+class Command(BaseCommand):
+    help = "Time the valuation batch job and endpoint against a seeded inventory (rolled back afterwards)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--iterations', type=int, default=20)
+
+    def _step(self, label, func):
+        start = time.perf_counter()
+        result = func()
+        self.stdout.write(f"  {label:<28} {(time.perf_counter() - start) * 1000:8.0f}ms")
+        return result
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            PriceSegment.objects.all().delete()
+            seed_cars(options['rows'])
+            self.stdout.write(f"{options['rows']} cars on {connection.vendor}")
+
+            df = self._step("load frame", valuation.load_frame)
+            segments = self._step("compute segments", lambda: valuation.compute_segments(df))
+            self._step("write segments", lambda: PriceSegment.objects.bulk_create(segments, batch_size=2000))
+            self.stdout.write(f"  {len(segments)} segments")
+            self._step("refresh_all", valuation.refresh_all)
+
+            valuation.mark_stale('toyota', 'Camry')
+            self._step("refresh one make/model", valuation.refresh_pending)
+            PendingValuation.objects.all().delete()
+
+            client = Client()
+            url = '/api/cars/bench-0/valuation/'
+            median, worst, queries = measure(lambda: client.get(url, HTTP_HOST='localhost'), options['iterations'])
+            self.stdout.write(f"  {url:<28} median {median:6.1f}ms  max {worst:6.1f}ms  {queries} queries")
@@ -0,0 +1,56 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from cars import popularity
+from cars.benchmarks import rolled_back, seed_cars
+from cars.models import Car
+
+
+class Command(BaseCommand):
+    help = "Compare a write per view with buffered view counts on a seeded inventory (rolled back afterwards)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000)
+        parser.add_argument('--hits', type=int, default=5000)
+        parser.add_argument('--max-pending', type=int, default=500)
+
+    def _run(self, label, func):
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            start = time.perf_counter()
+            func()
+            elapsed = (time.perf_counter() - start) * 1000
+        self.stdout.write(f"  {label:<24} {elapsed:8.0f}ms  {queries:6d} queries")
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            seed_cars(options['rows'])
+            ids = list(Car.objects.values_list('id', flat=True))
+            rng = random.Random(0)
+            # Skewed like real traffic: a few cars get most of the views.
+            hits = [ids[min(int(rng.paretovariate(1.2)) - 1, len(ids) - 1)] for _ in range(options['hits'])]
+            self.stdout.write(f"{len(hits)} views of {len(set(hits))} cars on {connection.vendor}")
+
+            def per_view():
+                now = time.time()
+                for car_id in hits:
+                    popularity.upsert({car_id: 1}, now)
+
+            def buffered():
+                buffer = popularity.MemoryBuffer()
+                for car_id in hits:
+                    if buffer.record(car_id) >= options['max_pending']:
+                        popularity.upsert(buffer.drain())
+                popularity.upsert(buffer.drain())
+
+            self._run("write per view", per_view)
+            self._run("buffered", buffered)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from cars import snapshots
+
+
+class Command(BaseCommand):
+    help = "Rebuild every static JSON snapshot of the catalogue."
+
+    def handle(self, *args, **options):
+        count = snapshots.publish_all()
+        self.stdout.write(f"Published list, featured, recent and {count} car snapshots to {snapshots.snapshot_root()}")
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from cars import duplicates
+from cars.models import ListingFingerprint
+
+
+class Command(BaseCommand):
+    help = "Fingerprint new or changed cars and record candidate duplicate listings for admin review."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Drop every fingerprint and recompute them all first.")
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--workers', type=int, default=None, help="Processes used to compute fingerprints.")
+        parser.add_argument('--loop', action='store_true', help="Keep polling instead of exiting when nothing is stale.")
+        parser.add_argument('--interval', type=float, default=60.0, help="Seconds to sleep between polls in --loop mode.")
+
+    def handle(self, *args, **options):
+        if options['full']:
+            ListingFingerprint.objects.all().delete()
+
+        while True:
+            while True:
+                cars, pairs = duplicates.process_stale(options['batch_size'], options['workers'])
+                if not cars:
+                    break
+                self.stdout.write(f"Fingerprinted {cars} cars, {pairs} candidate pairs")
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        clusters = duplicates.pending_clusters()
+        self.stdout.write(f"{len(clusters)} clusters awaiting review")
+        for cluster, candidates in clusters.items():
+            slugs = sorted({c.car.slug for c in candidates} | {c.other.slug for c in candidates})
+            best = max(c.text_similarity for c in candidates)
+            self.stdout.write(f"  {cluster}: {', '.join(slugs)} (text similarity up to {best:.2f})")
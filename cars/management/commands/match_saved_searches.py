@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from cars import saved_searches
+
+
+class Command(BaseCommand):
+    help = "Match newly listed cars against saved searches and queue alert emails in the outbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--loop', action='store_true', help="Keep polling instead of exiting when no cars are pending.")
+        parser.add_argument('--interval', type=float, default=10.0, help="Seconds to sleep between polls in --loop mode.")
+
+    def handle(self, *args, **options):
+        while True:
+            while True:
+                cars, emails = saved_searches.process_pending(options['batch_size'])
+                if not cars:
+                    break
+                self.stdout.write(f"Saved-search batch: {cars} cars, {emails} alert emails queued")
+
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
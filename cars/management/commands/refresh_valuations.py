@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from cars import valuation
+
+
+class Command(BaseCommand):
+    help = "Recompute market-price segments for make/models whose cars changed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Recompute every segment instead of only the pending ones.")
+        parser.add_argument('--loop', action='store_true', help="Keep polling instead of exiting when nothing is pending.")
+        parser.add_argument('--interval', type=float, default=30.0, help="Seconds to sleep between polls in --loop mode.")
+
+    def handle(self, *args, **options):
+        if options['full']:
+            start = time.perf_counter()
+            count = valuation.refresh_all()
+            self.stdout.write(f"Wrote {count} price segments in {time.perf_counter() - start:.1f}s")
+            return
+
+        while True:
+            while True:
+                pairs, count = valuation.refresh_pending()
+                if not pairs:
+                    break
+                self.stdout.write(f"Refreshed {pairs} make/models ({count} price segments)")
+
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from cars import outbox
+
+
+class Command(BaseCommand):
+    help = "Deliver pending emails from the outbox in batches over one mail connection."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--loop', action='store_true', help="Keep polling instead of exiting when the outbox is empty.")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds to sleep between polls in --loop mode.")
+
+    def handle(self, *args, **options):
+        while True:
+            outbox.requeue_stale()
+            while True:
+                sent, failed = outbox.drain_outbox(options['batch_size'])
+                if not (sent or failed):
+                    break
+                self.stdout.write(f"Outbox batch: {sent} sent, {failed} failed")
+
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
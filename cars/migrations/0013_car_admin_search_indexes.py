@@ -0,0 +1,51 @@
+from django.db import migrations
+
+
+# Indexes backing CarAdmin's search. They use PostgreSQL-only features, so
+# on other backends (e.g. a local SQLite database) this migration is a no-op.
+
+# istartswith compiles to UPPER(col::text) LIKE UPPER('term%').
+PREFIX_INDEXES = {
+    'car_title_upper_prefix_idx': 'title',
+    'car_make_upper_prefix_idx': 'make',
+    'car_model_upper_prefix_idx': 'model',
+}
+
+
+def _search_index():
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    return GinIndex(
+        SearchVector('description', 'primary_damage', config='english'),
+        name='car_description_search_idx',
+    )
+
+
+def add_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, column in PREFIX_INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS "{name}" ON "cars_car" (UPPER("{column}"::text) text_pattern_ops)'
+        )
+    schema_editor.add_index(apps.get_model('cars', 'Car'), _search_index())
+
+
+def remove_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in PREFIX_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{name}"')
+    schema_editor.remove_index(apps.get_model('cars', 'Car'), _search_index())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0012_cartombstone'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_indexes, remove_indexes),
+    ]
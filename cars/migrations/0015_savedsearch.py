@@ -0,0 +1,55 @@
+# Generated by Django 5.2.4 on 2026-10-19 17:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0014_archivedcar'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='outboundemail',
+            name='kind',
+            field=models.CharField(choices=[('plain', 'Plain'), ('email_verification', 'Email verification'), ('saved_search', 'Saved search alert')], default='plain', max_length=30),
+        ),
+        migrations.CreateModel(
+            name='PendingCarMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('car', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='cars.car')),
+            ],
+            options={
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SavedSearch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(help_text='Where alerts are sent', max_length=254)),
+                ('name', models.CharField(blank=True, max_length=100)),
+                ('make', models.CharField(blank=True, choices=[('audi', 'AUDI'), ('bently', 'BENTLY'), ('bmw', 'BMW'), ('ford', 'FORD'), ('gmc', 'GMC'), ('honda', 'HONDA'), ('hyundai', 'HYUNDAI'), ('jaguar', 'JAGUAR'), ('jeep', 'JEEP'), ('kia', 'KIA'), ('land rover', 'LAND ROVER'), ('lexus', 'LEXUS'), ('mazda', 'MAZDA'), ('mercedes', 'MERCEDES'), ('mitsubishi', 'MITSUBISHI'), ('nissan', 'NISSAN'), ('porsche', 'PORSCHE'), ('toyota', 'TOYOTA')], max_length=100)),
+                ('fuel_type', models.CharField(blank=True, choices=[('petrol', 'Petrol'), ('diesel', 'Diesel'), ('hybrid', 'Hybrid'), ('electric', 'Electric'), ('gas', 'Gas')], max_length=20)),
+                ('transmission', models.CharField(blank=True, choices=[('manual', 'Manual'), ('automatic', 'Automatic')], max_length=20)),
+                ('body_style', models.CharField(blank=True, max_length=50)),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('max_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('min_year', models.PositiveIntegerField(blank=True, null=True)),
+                ('max_year', models.PositiveIntegerField(blank=True, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_notified_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saved_searches', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
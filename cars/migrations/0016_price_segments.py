@@ -0,0 +1,41 @@
+# Generated by Django 5.2.4 on 2026-10-19 17:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0015_savedsearch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingValuation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('make', models.CharField(max_length=100)),
+                ('model', models.CharField(max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('make', 'model'), name='unique_pending_valuation')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PriceSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True)),
+                ('level', models.PositiveSmallIntegerField()),
+                ('make', models.CharField(max_length=100)),
+                ('model', models.CharField(max_length=100)),
+                ('count', models.PositiveIntegerField()),
+                ('quantiles', models.JSONField()),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['make', 'model'], name='cars_prices_make_769777_idx')],
+            },
+        ),
+    ]
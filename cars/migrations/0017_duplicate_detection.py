@@ -0,0 +1,52 @@
+# Generated by Django 5.2.4 on 2026-10-19 18:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0016_price_segments'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingFingerprint',
+            fields=[
+                ('car', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='fingerprint', serialize=False, to='cars.car')),
+                ('minhash', models.JSONField()),
+                ('image_hashes', models.JSONField(default=list)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DuplicateCandidate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cluster', models.BigIntegerField(db_index=True, help_text='Lowest car id among the connected candidates')),
+                ('text_similarity', models.FloatField()),
+                ('image_distance', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending review'), ('duplicate', 'Duplicate'), ('distinct', 'Not a duplicate')], default='pending', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('car', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='cars.car')),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='cars.car')),
+            ],
+            options={
+                'ordering': ['cluster', 'car_id'],
+                'constraints': [models.UniqueConstraint(fields=('car', 'other'), name='unique_duplicate_candidate')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LshBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField()),
+                ('bucket', models.BigIntegerField()),
+                ('fingerprint', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buckets', to='cars.listingfingerprint')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['bucket', 'band'], name='cars_lshbuc_bucket_9b2538_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-19 18:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0017_duplicate_detection'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CarViewStats',
+            fields=[
+                ('car', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='view_stats', serialize=False, to='cars.car')),
+                ('views', models.PositiveBigIntegerField(default=0)),
+                ('score', models.FloatField(default=0)),
+                ('scored_at', models.FloatField(default=0)),
+                ('rank', models.FloatField(db_index=True, default=0)),
+            ],
+        ),
+    ]
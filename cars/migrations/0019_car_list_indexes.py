@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-19 18:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0018_carviewstats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['is_available', 'created_at'], name='cars_car_is_avai_94be63_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['is_available', 'is_featured', 'created_at'], name='cars_car_is_avai_101bb5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['is_available', 'make', 'created_at'], name='cars_car_is_avai_c982f5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['is_available', 'updated_at', 'id'], name='cars_car_is_avai_b4e693_idx'),
+        ),
+    ]
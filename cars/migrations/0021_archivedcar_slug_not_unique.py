@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0020_savedsearch_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archivedcar',
+            name='slug',
+            field=models.SlugField(),
+        ),
+    ]
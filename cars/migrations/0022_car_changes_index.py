@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-19 18:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0021_archivedcar_slug_not_unique'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['updated_at', 'id'], name='cars_car_updated_26f7c2_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-19 18:47
+
+from django.db import migrations, models
+
+
+def drop_fingerprints(apps, schema_editor):
+    # Image buckets are now 3 wide chunks instead of 6 narrow ones, and
+    # fingerprints need a source digest; `find_duplicates` recomputes them.
+    apps.get_model('cars', 'ListingFingerprint').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0022_car_changes_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listingfingerprint',
+            name='source',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.RunPython(drop_fingerprints, migrations.RunPython.noop),
+    ]
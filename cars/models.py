@@ -1,4 +1,8 @@
+import uuid
+
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
 from django.utils.text import slugify
 from django.contrib.auth.models import User
 from cloudinary.models import CloudinaryField
@@ -95,6 +99,17 @@ class Car(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        # From `manage.py audit_queries`: the public lists filter on
+        # is_available (and is_featured/make) and order by created_at; the
+        # changes feed pages by (updated_at, id), available cars only when
+        # bootstrapping.
+        indexes = [
+            models.Index(fields=['is_available', 'created_at']),
+            models.Index(fields=['is_available', 'is_featured', 'created_at']),
+            models.Index(fields=['is_available', 'make', 'created_at']),
+            models.Index(fields=['is_available', 'updated_at', 'id']),
+            models.Index(fields=['updated_at', 'id']),
+        ]
     
     def __str__(self):
         return self.title
@@ -116,4 +131,204 @@ class CarImage(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
-        return f"{self.car.title} - Image"
\ No newline at end of file
+        return f"{self.car.title} - Image"
+
+class OutboundEmail(models.Model):
+    """
+    Transactional email outbox. Requests only insert rows here; the
+    send_outbox worker delivers them in batches over one SMTP connection.
+    """
+    KIND_CHOICES = [
+        ('plain', 'Plain'),
+        ('email_verification', 'Email verification'),
+        ('saved_search', 'Saved search alert'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES, default='plain')
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=200)
+    body = models.TextField(blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.recipient} ({self.status})"
+
+
+class CarTombstone(models.Model):
+    """Records deleted cars so the change feed can report them."""
+    car_id = models.BigIntegerField()
+    slug = models.SlugField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['deleted_at']
+
+    def __str__(self):
+        return f"{self.slug} (deleted {self.deleted_at:%Y-%m-%d %H:%M})"
+
+
+class ArchivedCar(models.Model):
+    """
+    A car moved out of the hot Car table by the archive_cars command. The
+    full Car row and its images are kept in `data` so it can be restored;
+    the indexed slug keeps old links resolvable.
+    """
+    original_id = models.BigIntegerField(unique=True)
+    # Not unique: a relisted car can reuse the slug of an archived one and
+    # later be archived too. The newest archive row wins.
+    slug = models.SlugField()
+    title = models.CharField(max_length=200)
+    make = models.CharField(max_length=100)
+    model = models.CharField(max_length=100)
+    year = models.CharField(max_length=5)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-archived_at']
+
+    def __str__(self):
+        return self.title
+
+
+class SavedSearch(models.Model):
+    """A buyer's alert over the Car filter fields. Empty fields match anything."""
+    user = models.ForeignKey(User, related_name='saved_searches', on_delete=models.CASCADE)
+    email = models.EmailField(help_text="Where alerts are sent")
+    name = models.CharField(max_length=100, blank=True)
+    make = models.CharField(max_length=100, choices=Car.CAR_BRAND, blank=True)
+    fuel_type = models.CharField(max_length=20, choices=Car.FUEL_CHOICES, blank=True)
+    transmission = models.CharField(max_length=20, choices=Car.TRANSMISSION_CHOICES, blank=True)
+    body_style = models.CharField(max_length=50, blank=True)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    min_year = models.PositiveIntegerField(blank=True, null=True)
+    max_year = models.PositiveIntegerField(blank=True, null=True)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    last_notified_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return self.name or f"Saved search {self.pk}"
+
+
+class PendingCarMatch(models.Model):
+    """Newly listed cars waiting to be matched against saved searches."""
+    car = models.OneToOneField(Car, related_name='+', on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+
+
+class PriceSegment(models.Model):
+    """
+    Price distribution of one group of comparable cars, precomputed by
+    cars/valuation.py. `quantiles` holds prices at every 5th percentile.
+    """
+    key = models.CharField(max_length=255, unique=True)
+    level = models.PositiveSmallIntegerField()
+    make = models.CharField(max_length=100)
+    model = models.CharField(max_length=100)
+    count = models.PositiveIntegerField()
+    quantiles = models.JSONField()
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['make', 'model'])]
+
+    def __str__(self):
+        return self.key
+
+
+class PendingValuation(models.Model):
+    """A make/model whose price segments need recomputing."""
+    make = models.CharField(max_length=100)
+    model = models.CharField(max_length=100)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['make', 'model'], name='unique_pending_valuation')]
+
+
+class ListingFingerprint(models.Model):
+    """MinHash signature and image hashes of a car, see cars/duplicates.py."""
+    car = models.OneToOneField(Car, primary_key=True, related_name='fingerprint', on_delete=models.CASCADE)
+    source = models.CharField(max_length=32, blank=True, default='')
+    minhash = models.JSONField()
+    image_hashes = models.JSONField(default=list)
+    computed_at = models.DateTimeField(auto_now=True)
+
+
+class LshBucket(models.Model):
+    """One LSH band of a fingerprint; cars sharing a bucket are duplicate candidates."""
+    fingerprint = models.ForeignKey(ListingFingerprint, related_name='buckets', on_delete=models.CASCADE)
+    band = models.PositiveSmallIntegerField()
+    bucket = models.BigIntegerField()
+
+    class Meta:
+        indexes = [models.Index(fields=['bucket', 'band'])]
+
+
+class DuplicateCandidate(models.Model):
+    """A pair of cars that look like the same listing, awaiting admin review."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending review'),
+        ('duplicate', 'Duplicate'),
+        ('distinct', 'Not a duplicate'),
+    ]
+
+    car = models.ForeignKey(Car, related_name='+', on_delete=models.CASCADE)
+    other = models.ForeignKey(Car, related_name='+', on_delete=models.CASCADE)
+    cluster = models.BigIntegerField(db_index=True, help_text="Lowest car id among the connected candidates")
+    text_similarity = models.FloatField()
+    image_distance = models.PositiveSmallIntegerField(blank=True, null=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['cluster', 'car_id']
+        constraints = [models.UniqueConstraint(fields=['car', 'other'], name='unique_duplicate_candidate')]
+
+    def __str__(self):
+        return f"{self.car_id} ~ {self.other_id}"
+
+
+class CarViewStats(models.Model):
+    """
+    Detail-page views per car, written in batches by cars/popularity.py.
+    `score` is the view count decayed to `scored_at` (Unix time); `rank`
+    orders cars by decayed score at any moment, so it can be indexed.
+    """
+    car = models.OneToOneField(Car, primary_key=True, related_name='view_stats', on_delete=models.CASCADE)
+    views = models.PositiveBigIntegerField(default=0)
+    score = models.FloatField(default=0)
+    scored_at = models.FloatField(default=0)
+    rank = models.FloatField(default=0, db_index=True)
+
+    def __str__(self):
+        return f"{self.car_id}: {self.views} views"
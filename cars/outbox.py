@@ -0,0 +1,120 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+from firebase_admin import auth as firebase_auth
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, 'CARS_OUTBOX', {}).get(name, default)
+
+
+def enqueue_email(recipient, subject, body='', kind='plain'):
+    return OutboundEmail.objects.create(
+        recipient=recipient, subject=subject, body=body, kind=kind,
+    )
+
+
+def enqueue_verification_email(email):
+    # The Firebase link is generated by the worker, so the request that
+    # enqueues this makes no outbound calls at all.
+    return enqueue_email(email, 'Verify your email', kind='email_verification')
+
+
+def _render(email):
+    if email.kind == 'email_verification':
+        action_code_settings = firebase_auth.ActionCodeSettings(
+            url=_setting('verification_url', 'https://cheaprides.com/'),
+            handle_code_in_app=True
+        )
+        link = firebase_auth.generate_email_verification_link(email.recipient, action_code_settings)
+        return f"Click this link to verify your account: {link}"
+    return email.body
+
+
+def _claim_batch(batch_size):
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            OutboundEmail.objects
+            .select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by('next_attempt_at')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        # next_attempt_at doubles as the claim time while a row is 'sending'.
+        OutboundEmail.objects.filter(id__in=ids).update(status='sending', next_attempt_at=now)
+    return list(OutboundEmail.objects.filter(id__in=ids).order_by('created_at'))
+
+
+def _mark_failed(email, error):
+    max_attempts = _setting('max_attempts', 5)
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= max_attempts:
+        email.status = 'failed'
+    else:
+        email.status = 'pending'
+        delay = _setting('backoff_seconds', 30) * 2 ** (email.attempts - 1)
+        email.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+    email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def drain_outbox(batch_size=None):
+    """
+    Send one batch of due emails over a single mail connection.
+    Returns (sent, failed) counts for the batch.
+    """
+    batch = _claim_batch(batch_size or _setting('batch_size', 50))
+    if not batch:
+        return 0, 0
+
+    sent = failed = 0
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        logger.warning("Outbox could not open mail connection: %s", e)
+        for email in batch:
+            _mark_failed(email, e)
+        return 0, len(batch)
+
+    try:
+        for email in batch:
+            try:
+                message = EmailMessage(
+                    subject=email.subject,
+                    body=_render(email),
+                    to=[email.recipient],
+                    connection=connection,
+                )
+                message.send()
+            except Exception as e:
+                logger.warning("Outbox email %s failed: %s", email.id, e)
+                _mark_failed(email, e)
+                failed += 1
+                continue
+
+            email.attempts += 1
+            email.status = 'sent'
+            email.sent_at = timezone.now()
+            email.last_error = ''
+            email.save(update_fields=['attempts', 'status', 'sent_at', 'last_error'])
+            sent += 1
+    finally:
+        connection.close()
+
+    return sent, failed
+
+
+def requeue_stale(older_than=timedelta(minutes=10)):
+    """Return rows stuck in 'sending' (e.g. the worker was killed) to the queue."""
+    cutoff = timezone.now() - older_than
+    return OutboundEmail.objects.filter(status='sending', next_attempt_at__lte=cutoff).update(status='pending')
@@ -0,0 +1,244 @@
+import atexit
+import logging
+import math
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import connection, connections, transaction
+
+from .inventory import versioned_key
+from .models import Car, CarViewStats
+from .serializers import CarListSerializer
+
+logger = logging.getLogger(__name__)
+
+# Detail-page view counts without a write per request.
+#
+# Hits are buffered and flushed in the background, `flush_seconds` after the
+# first unflushed hit or as soon as `max_pending` hits are waiting, as one
+# INSERT ... ON CONFLICT upsert into CarViewStats.
+#
+# Configured through settings.CARS_POPULARITY. The 'memory' backend buffers
+# per process. The 'cache' backend counts in a shared Django cache, in
+# windows of `flush_seconds`, so hits on a car from every worker reach the
+# database as one row of one upsert. A closed window is claimed key by key
+# with cache.delete(), which only one worker can win; `max_pending` doesn't
+# apply, as windows are flushed once they close.
+#
+# Scores decay with a half-life of `half_life_hours`. Since decay scales
+# every score by the same factor, ln(score) + scored_at * ln2 / half-life
+# orders cars by their current score at any moment. It is stored as the
+# indexed `rank`, so /cars/trending/ is an index scan rather than a decay
+# computed over every row. (After changing the half-life, ranks settle as
+# cars are viewed again.)
+
+
+def _config():
+    return getattr(settings, 'CARS_POPULARITY', {})
+
+
+def _half_life():
+    return _config().get('half_life_hours', 24) * 3600
+
+
+class MemoryBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._pending = 0
+
+    def record(self, car_id):
+        """Returns the number of hits waiting to be flushed."""
+        with self._lock:
+            self._counts[car_id] += 1
+            self._pending += 1
+            return self._pending
+
+    def drain(self, final=False):
+        with self._lock:
+            counts, self._counts, self._pending = self._counts, Counter(), 0
+        return counts
+
+    def has_pending(self):
+        return bool(self._pending)
+
+
+class CacheBuffer:
+    def __init__(self, alias='default', window=10):
+        self.cache = caches[alias]
+        self.window = window
+        self._lock = threading.Lock()
+        # Car ids this process has counted, per window, so it knows which
+        # keys to collect once the window closes.
+        self._touched = {}
+
+    def _key(self, window, car_id):
+        return f'cars:views:{window}:{car_id}'
+
+    def record(self, car_id):
+        window = int(time.time() // self.window)
+        key = self._key(window, car_id)
+        self.cache.add(key, 0, self.window * 10)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.cache.set(key, 1, self.window * 10)
+        with self._lock:
+            self._touched.setdefault(window, set()).add(car_id)
+        return 0
+
+    def has_pending(self):
+        with self._lock:
+            return bool(self._touched)
+
+    def drain(self, final=False):
+        """
+        Collects closed windows. `final` (at process exit) also takes the open
+        one; a hit landing between its get and delete is lost.
+        """
+        current = int(time.time() // self.window)
+        with self._lock:
+            closed = {window: ids for window, ids in self._touched.items() if final or window < current}
+            for window in closed:
+                del self._touched[window]
+
+        counts = Counter()
+        for window, ids in closed.items():
+            keys = {self._key(window, car_id): car_id for car_id in ids}
+            for key, value in self.cache.get_many(keys).items():
+                # Several workers may have counted the same car; whoever
+                # deletes the key first reports it.
+                if value and self.cache.delete(key):
+                    counts[keys[key]] += value
+        return counts
+
+
+def upsert(counts, now=None):
+    """Adds `counts` ({car id: views}) to CarViewStats in one statement."""
+    now = time.time() if now is None else now
+    with transaction.atomic():
+        # Cars deleted since they were viewed would violate the foreign key.
+        existing = set(Car.objects.filter(id__in=list(counts)).values_list('id', flat=True))
+        rows = [(car_id, count) for car_id, count in counts.items() if car_id in existing and count > 0]
+        if not rows:
+            return 0
+
+        half_life = _half_life()
+        table = connection.ops.quote_name(CarViewStats._meta.db_table)
+        new_score = f'excluded.score + {table}.score * POWER(0.5, (excluded.scored_at - {table}.scored_at) / %s)'
+        sql = (
+            f'INSERT INTO {table} (car_id, views, score, scored_at, rank) VALUES '
+            + ', '.join(['(%s, %s, %s, %s, %s)'] * len(rows))
+            + f' ON CONFLICT (car_id) DO UPDATE SET'
+            f' views = {table}.views + excluded.views,'
+            f' score = {new_score},'
+            f' rank = LN({new_score}) + excluded.scored_at * %s,'
+            f' scored_at = excluded.scored_at'
+        )
+        params = []
+        for car_id, count in rows:
+            params += [car_id, count, float(count), now, math.log(count) + now * math.log(2) / half_life]
+        params += [half_life, half_life, math.log(2) / half_life]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+    return len(rows)
+
+
+class ViewCounter:
+    def __init__(self, buffer, flush_seconds, max_pending):
+        self.buffer = buffer
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def record(self, car_id):
+        pending = self.buffer.record(car_id)
+        with self._lock:
+            if pending >= self.max_pending:
+                self._schedule(0)
+            elif self._timer is None:
+                self._schedule(self.flush_seconds)
+
+    def _schedule(self, delay):
+        if self._timer is not None:
+            if delay:
+                return
+            self._timer.cancel()
+        self._timer = threading.Timer(delay, self._flush_in_background)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def flush(self, final=False):
+        with self._lock:
+            self._timer = None
+        try:
+            counts = self.buffer.drain(final)
+            if counts:
+                upsert(counts)
+        except Exception:
+            logger.exception("Could not flush view counts")
+        # Hits that arrived during the flush, or cache windows still open,
+        # go out with the next one.
+        with self._lock:
+            if not final and self.buffer.has_pending() and self._timer is None:
+                self._schedule(self.flush_seconds)
+
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        finally:
+            # Each timer is a new thread with its own connection.
+            connections.close_all()
+
+
+_counter = None
+_counter_lock = threading.Lock()
+
+
+def get_counter():
+    global _counter
+    with _counter_lock:
+        if _counter is None:
+            config = _config()
+            flush_seconds = config.get('flush_seconds', 10)
+            if config.get('backend') == 'cache':
+                buffer = CacheBuffer(config.get('cache_alias', 'default'), flush_seconds)
+            else:
+                buffer = MemoryBuffer()
+            _counter = ViewCounter(buffer, flush_seconds, config.get('max_pending', 500))
+            atexit.register(_counter.flush, True)
+        return _counter
+
+
+def record_view(car_id):
+    if _config().get('enabled', True):
+        get_counter().record(car_id)
+
+
+def decayed_score(stats, now=None):
+    now = time.time() if now is None else now
+    return stats.score * 0.5 ** ((now - stats.scored_at) / _half_life())
+
+
+def trending(limit=None):
+    """Most viewed available cars by decayed score, cached for `cache_seconds`."""
+    limit = limit or _config().get('trending_limit', 12)
+    key = versioned_key('trending', limit)
+    payload = cache.get(key)
+    if payload is None:
+        now = time.time()
+        stats = list(
+            CarViewStats.objects.filter(car__is_available=True)
+            .select_related('car').order_by('-rank')[:limit]
+        )
+        payload = [
+            {**CarListSerializer(s.car).data, 'views': s.views, 'score': round(decayed_score(s, now), 3)}
+            for s in stats
+        ]
+        cache.set(key, payload, _config().get('cache_seconds', 60))
+    return payload
@@ -0,0 +1,303 @@
+import io
+import re
+from contextlib import ExitStack, contextmanager, redirect_stdout
+from datetime import timedelta
+
+from django.apps import apps
+from django.db import connections
+from django.test import override_settings
+from django.urls import URLPattern
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import changes, outbox, urls as car_urls
+from .models import Car, SavedSearch
+
+# Which queries behind the cars API can't use an index.
+#
+# Every GET route in cars/urls.py is requested against a seeded dataset
+# (no caching, so each route really queries), the SQL is captured and each
+# distinct SELECT is EXPLAINed on the database it ran on:
+#
+#   SQLite      EXPLAIN QUERY PLAN; "SCAN <table>" without an index is a
+#               sequential scan, "SCAN <table> USING INDEX" a full index
+#               scan and "USE TEMP B-TREE" a sort.
+#   PostgreSQL  EXPLAIN (FORMAT JSON) with enable_seqscan and enable_sort
+#               off, so the planner picks an index whenever one can serve
+#               the query however small the seeded tables are. A Seq Scan
+#               or Sort left in the plan has no index to use. Those settings
+#               also push the planner into reading a whole index in order,
+#               so index scans without an Index Cond are flagged too, unless
+#               a LIMIT stops them early (top-N in index order) or they go
+#               away once sorting is allowed again.
+#
+# Routes are requested once per entry in ROUTE_QUERY_STRINGS (once without
+# a query string if they have none), so e.g. both the bootstrap and the
+# incremental change feed queries are seen. Class and @api_view routes
+# without a GET handler are skipped; plain function views are requested
+# and skipped only if they answer 405.
+#
+# Django renders filter(is_available=True) as a bare WHERE "is_available",
+# which SQLite can't match against an index column, so boolean filters stay
+# flagged there even when an index exists. Act on the PostgreSQL report.
+#
+# For flagged queries on cars tables an index is proposed: the columns the
+# outer query filters on, then the ones it orders by. Django qualifies outer
+# columns with the table name and subquery columns with an alias (U0), so
+# the two don't mix. Proposals already covered by an existing index, or
+# by a longer proposal, are dropped.
+
+ROUTE_QUERY_STRINGS = {
+    'car-batch': ['?slugs={slug},{other_slug}'],
+    'car-facets': ['?make=toyota'],
+    'car-changes': ['', '?since={since}', '?since={since_after}'],
+}
+POST_ONLY = 'skipped (no GET)'
+
+
+def _view_class(callback):
+    return getattr(callback, 'cls', None) or getattr(callback, 'view_class', None)
+
+
+def routes(prefix='/api/'):
+    """(name, route, view class) for every pattern in cars/urls.py, once each."""
+    seen = set()
+    for pattern in car_urls.urlpatterns:
+        if not isinstance(pattern, URLPattern):
+            continue
+        route = str(pattern.pattern)
+        if route in seen:
+            continue
+        seen.add(route)
+        yield pattern.name, prefix + route, _view_class(pattern.callback)
+
+
+def fill_route(name, route, sample):
+    """Requestable paths for `route`, using seeded objects for its parameters."""
+    path = re.sub(r'<(?:\w+:)?(\w+)>', lambda match: str(sample[match.group(1)]), route)
+    return [path + query.format(**sample) for query in ROUTE_QUERY_STRINGS.get(name, [''])]
+
+
+@contextmanager
+def capture_sql():
+    """Collects (alias, sql, params) of every statement run on any database."""
+    captured = []
+
+    def wrapper(execute, sql, params, many, context):
+        captured.append((context['connection'].alias, sql, params))
+        return execute(sql, params, many, context)
+
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(wrapper))
+        yield captured
+
+
+def exercise_routes(user, sample):
+    """[(path, status or POST_ONLY, captured statements)] for every route."""
+    client = APIClient()
+    client.force_authenticate(user)
+    results = []
+    overrides = override_settings(
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+        CARS_POPULARITY={'enabled': False},
+    )
+    # Some admin views print progress; keep it out of the report.
+    with overrides, redirect_stdout(io.StringIO()):
+        for name, route, view_class in routes():
+            for path in fill_route(name, route, sample):
+                if view_class is not None and not hasattr(view_class, 'get'):
+                    results.append((path, POST_ONLY, []))
+                    continue
+                with capture_sql() as captured:
+                    response = client.get(path, HTTP_HOST='localhost')
+                if view_class is None and response.status_code == 405:
+                    # Plain function views check the method themselves.
+                    results.append((path, POST_ONLY, []))
+                    continue
+                results.append((path, response.status_code, captured))
+    return results
+
+
+def _is_select(sql):
+    return sql.lstrip().upper().startswith('SELECT')
+
+
+def _sqlite_issues(cursor, sql, params):
+    cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+    aliases = _table_aliases(sql)
+    issues = []
+    for row in cursor.fetchall():
+        detail = row[-1]
+        match = re.match(r'SCAN (\w+)', detail)
+        if match and 'PRIMARY KEY' not in detail:
+            kind = 'full index scan' if 'INDEX' in detail else 'seq scan'
+            issues.append((kind, aliases.get(match.group(1), match.group(1))))
+        elif re.match(r'USE TEMP B-TREE FOR (ORDER|GROUP) BY', detail):
+            # Not DISTINCT aggregates, which no index avoids.
+            issues.append(('sort', _outer_table(sql)))
+    if ' LIMIT ' in sql and not any(kind == 'sort' for kind, _ in issues):
+        # Read in index order and stopped by the LIMIT.
+        issues = [issue for issue in issues if issue[0] != 'full index scan']
+    return issues
+
+
+def _postgresql_plan_issues(cursor, sql, params, sort):
+    cursor.execute('SET LOCAL enable_seqscan = off')
+    cursor.execute(f"SET LOCAL enable_sort = {'on' if sort else 'off'}")
+    cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+    plan = cursor.fetchone()[0]
+    issues = []
+
+    def walk(node, limited=False):
+        limited = limited or node['Node Type'] == 'Limit'
+        if node['Node Type'] == 'Seq Scan':
+            issues.append(('seq scan', node['Relation Name']))
+        elif node['Node Type'] in ('Index Scan', 'Index Only Scan') and 'Index Cond' not in node and not limited:
+            issues.append(('full index scan', node['Relation Name']))
+        elif node['Node Type'] in ('Sort', 'Incremental Sort'):
+            issues.append(('sort', _outer_table(sql)))
+        for child in node.get('Plans', []):
+            walk(child, limited)
+
+    walk(plan[0]['Plan'])
+    return issues
+
+
+def _postgresql_issues(cursor, sql, params):
+    issues = _postgresql_plan_issues(cursor, sql, params, sort=False)
+    if any(kind == 'full index scan' for kind, _ in issues):
+        # Without sorts the planner may read a whole index in order just to
+        # feed e.g. COUNT(DISTINCT id) a few rows an Index Cond found.
+        # Only keep the full index scans that remain when sorting is allowed.
+        remaining = _postgresql_plan_issues(cursor, sql, params, sort=True)
+        issues = [issue for issue in issues if issue[0] != 'full index scan' or issue in remaining]
+    return issues
+
+
+EXPLAINERS = {'sqlite': _sqlite_issues, 'postgresql': _postgresql_issues}
+UNSUPPORTED = 'unsupported backend'
+
+
+def explain(alias, sql, params):
+    """
+    [(kind, table)] of the sequential scans and sorts in a query's plan, or
+    [(UNSUPPORTED, vendor)] for a database EXPLAINERS can't read.
+    """
+    connection = connections[alias]
+    if connection.vendor not in EXPLAINERS:
+        return [(UNSUPPORTED, connection.vendor)]
+    with connection.cursor() as cursor:
+        return list(dict.fromkeys(EXPLAINERS[connection.vendor](cursor, sql, params)))
+
+
+def audit(results):
+    """
+    {(alias, sql): {'paths': [...], 'issues': [...]}} for every distinct
+    SELECT the routes ran that has a sequential scan or sort.
+    """
+    queries = {}
+    for path, _, captured in results:
+        for alias, sql, params in captured:
+            if _is_select(sql):
+                queries.setdefault((alias, sql), {'params': params, 'paths': []})['paths'].append(path)
+    flagged = {}
+    for (alias, sql), query in queries.items():
+        issues = explain(alias, sql, query['params'])
+        if issues:
+            flagged[alias, sql] = {'paths': list(dict.fromkeys(query['paths'])), 'issues': issues}
+    return flagged
+
+
+def _table_aliases(sql):
+    return {alias: table for table, alias in re.findall(r'(?:FROM|JOIN) "(\w+)" (\w+)', sql)}
+
+
+def _outer_table(sql):
+    match = re.search(r'\bFROM "(\w+)"', sql)
+    return match.group(1) if match else None
+
+
+def _clause(sql, keyword, ends):
+    start = sql.rfind(keyword) if keyword == ' ORDER BY ' else sql.find(keyword)
+    if start < 0:
+        return ''
+    start += len(keyword)
+    stops = [index for index in (sql.find(end, start) for end in ends) if index >= 0]
+    return sql[start:min(stops)] if stops else sql[start:]
+
+
+def index_columns(sql, table, unique=()):
+    """
+    Columns of `table` an index for this query would need, or [] when it
+    has none or already looks rows up by a `unique` column.
+    """
+    column = rf'"{table}"\."(\w+)"'
+    where = _clause(sql, ' WHERE ', (' GROUP BY ', ' ORDER BY ', ' LIMIT '))
+    order = _clause(sql, ' ORDER BY ', (' LIMIT ', ' OFFSET '))
+
+    equality, ranges = [], []
+    for match in re.finditer(column + r'\s*(<=|>=|<|>)?', where):
+        if where[:match.start()].endswith('NOT ('):
+            continue
+        (ranges if match.group(2) else equality).append(match.group(1))
+    equality = list(dict.fromkeys(equality))
+    if set(equality) & set(unique):
+        return []
+    ranges = [name for name in dict.fromkeys(ranges) if name not in equality]
+    ordering = list(dict.fromkeys(re.findall(column, order)))
+    # A range condition ends what a B-tree can use, unless the ORDER BY
+    # starts with the same column; otherwise the ORDER BY can follow the
+    # equality columns.
+    tail = ranges[:1] if ranges and ordering[:1] != ranges[:1] else ordering
+    return (equality + [name for name in tail if name not in equality])[:3]
+
+
+def _existing_indexes(alias, table):
+    """(column lists of the table's indexes, columns unique on their own)."""
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table).values()
+    indexes = [info['columns'] for info in constraints if info['columns'] and (info['index'] or info['unique'] or info['primary_key'])]
+    unique = {info['columns'][0] for info in constraints if (info['unique'] or info['primary_key']) and len(info['columns']) == 1}
+    return indexes, unique
+
+
+def propose_indexes(flagged, app_label='cars'):
+    """{model: [field name lists]} of indexes that would serve the flagged queries."""
+    models = {model._meta.db_table: model for model in apps.get_app_config(app_label).get_models()}
+    wanted = {}
+    for (alias, sql), query in flagged.items():
+        for _, table in query['issues']:
+            if table not in models:
+                continue
+            existing, unique = _existing_indexes(alias, table)
+            columns = index_columns(sql, table, unique)
+            if not columns or any(index[:len(columns)] == columns for index in existing):
+                continue
+            wanted.setdefault(models[table], {})[tuple(columns)] = None
+
+    proposals = {}
+    for model, candidates in wanted.items():
+        column_names = {field.column: field.name for field in model._meta.concrete_fields}
+        kept = [
+            columns for columns in candidates
+            if not any(other != columns and other[:len(columns)] == columns for other in candidates)
+        ]
+        proposals[model] = [[column_names.get(column, column) for column in columns] for columns in kept]
+    return proposals
+
+
+def sample_objects(user):
+    """Parameters for routes that need existing objects."""
+    slugs = list(Car.objects.filter(is_available=True).order_by('id').values_list('slug', flat=True)[:2])
+    search = SavedSearch.objects.create(user=user, email=user.email or 'audit@example.com', make='toyota')
+    since = timezone.now() - timedelta(days=1)
+    return {
+        'slug': slugs[0],
+        'other_slug': slugs[-1],
+        'pk': search.pk,
+        'token': outbox.enqueue_email(user.email or 'audit@example.com', 'Audit').token,
+        'since': changes.encode_token(since),
+        'since_after': changes.encode_token(since, search.pk),
+    }
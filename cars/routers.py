@@ -0,0 +1,77 @@
+from contextvars import ContextVar
+
+from django.conf import settings
+
+
+# Read-replica routing for the anonymous catalogue views.
+#
+# Views opt in with ReplicaReadMixin; everything else (admin, auth, Firebase
+# user upserts) keeps using 'default'. After a staff member writes,
+# ReplicaPinningMiddleware sets a short-lived cookie that pins that client's
+# reads to the primary so they see their own changes despite replica lag.
+# With no 'replica' alias in DATABASES all reads go to 'default'.
+
+REPLICA_ALIAS = 'replica'
+
+_read_from_replica = ContextVar('read_from_replica', default=False)
+_pinned_to_primary = ContextVar('pinned_to_primary', default=False)
+_wrote = ContextVar('wrote', default=False)
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _read_from_replica.get() and not _pinned_to_primary.get() and replica_configured():
+            return REPLICA_ALIAS
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data.
+        return True
+
+
+class ReplicaReadMixin:
+    """Routes the ORM reads of a read-only view to the replica."""
+
+    def dispatch(self, request, *args, **kwargs):
+        token = _read_from_replica.set(True)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            _read_from_replica.reset(token)
+
+
+class ReplicaPinningMiddleware:
+    cookie_name = 'pin_primary'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def _is_staff(self, request):
+        user = getattr(request, 'user', None)
+        return user is not None and (user.is_staff or user.is_superuser)
+
+    def __call__(self, request):
+        pinned = _pinned_to_primary.set(self.cookie_name in request.COOKIES)
+        wrote = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            if _wrote.get() and replica_configured() and self._is_staff(request):
+                response.set_cookie(
+                    self.cookie_name, '1',
+                    max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 15),
+                    secure=not settings.DEBUG,
+                    httponly=True,
+                    samesite='None' if not settings.DEBUG else 'Lax',
+                )
+            return response
+        finally:
+            _pinned_to_primary.reset(pinned)
+            _wrote.reset(wrote)
@@ -0,0 +1,219 @@
+import itertools
+import math
+from collections import defaultdict
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .models import Car, PendingCarMatch, SavedSearch
+from .outbox import enqueue_email
+
+# Matching one newly listed car against every saved search.
+#
+# Searches are grouped by their exact (make, fuel_type, transmission,
+# body_style) constraint, with None standing for "any". A car can only match
+# the 2**4 groups obtained by replacing some of its own values with None, so
+# matching is 16 dict lookups followed by an interval-tree stab on price in
+# each group that exists; the year range is checked on the few survivors.
+# Neither step looks at searches that can't match.
+
+CATEGORICAL = ('make', 'fuel_type', 'transmission', 'body_style')
+
+
+def _config():
+    return getattr(settings, 'CARS_SAVED_SEARCHES', {})
+
+
+class SearchSpec(NamedTuple):
+    id: int
+    make: str
+    fuel_type: str
+    transmission: str
+    body_style: str
+    min_price: float
+    max_price: float
+    min_year: float
+    max_year: float
+
+
+def _category(value):
+    return (value.strip().lower() or None) if value else None
+
+
+def _bound(value, default):
+    return default if value is None else float(value)
+
+
+def spec_from_row(row):
+    """Builds a SearchSpec from a SavedSearch `values()` row."""
+    return SearchSpec(
+        row['id'],
+        *(_category(row[field]) for field in CATEGORICAL),
+        _bound(row['min_price'], -math.inf),
+        _bound(row['max_price'], math.inf),
+        _bound(row['min_year'], -math.inf),
+        _bound(row['max_year'], math.inf),
+    )
+
+
+def car_values(car):
+    """(categories, price, year) of a Car, in the form the index expects."""
+    try:
+        year = float(car.year)
+    except (TypeError, ValueError):
+        year = None
+    return tuple(_category(getattr(car, field)) for field in CATEGORICAL), float(car.price), year
+
+
+class IntervalTree:
+    """
+    Static centered interval tree over closed [lo, hi] ranges. stab(x)
+    returns every item whose range contains x in O(log n + matches).
+    """
+
+    __slots__ = ('center', 'by_lo', 'by_hi', 'left', 'right')
+
+    def __init__(self, intervals):
+        points = sorted(p for lo, hi, _ in intervals for p in (lo, hi) if math.isfinite(p))
+        self.center = points[len(points) // 2] if points else 0.0
+        left, right, middle = [], [], []
+        for interval in intervals:
+            if interval[1] < self.center:
+                left.append(interval)
+            elif interval[0] > self.center:
+                right.append(interval)
+            else:
+                middle.append(interval)
+        self.by_lo = sorted(middle, key=lambda interval: interval[0])
+        self.by_hi = sorted(middle, key=lambda interval: interval[1], reverse=True)
+        self.left = IntervalTree(left) if left else None
+        self.right = IntervalTree(right) if right else None
+
+    def stab(self, x):
+        found = []
+        node = self
+        while node is not None:
+            if x < node.center:
+                for lo, _, item in node.by_lo:
+                    if lo > x:
+                        break
+                    found.append(item)
+                node = node.left
+            elif x > node.center:
+                for _, hi, item in node.by_hi:
+                    if hi < x:
+                        break
+                    found.append(item)
+                node = node.right
+            else:
+                found.extend(item for _, _, item in node.by_lo)
+                break
+        return found
+
+
+class SavedSearchIndex:
+    def __init__(self, specs):
+        groups = defaultdict(list)
+        for spec in specs:
+            groups[spec[1:5]].append((spec.min_price, spec.max_price, spec))
+        self.groups = {key: IntervalTree(intervals) for key, intervals in groups.items()}
+        self.size = sum(len(intervals) for intervals in groups.values())
+
+    def match(self, categories, price, year):
+        """Ids of the searches matching a car with these values."""
+        # A set, because a car missing a value (e.g. no body_style) yields
+        # the same key whether that field is kept or wildcarded.
+        keys = {
+            tuple(value if kept else None for value, kept in zip(categories, keep))
+            for keep in itertools.product((True, False), repeat=len(CATEGORICAL))
+        }
+        matches = []
+        for key in keys:
+            tree = self.groups.get(key)
+            if tree is None:
+                continue
+            for spec in tree.stab(price):
+                if year is None:
+                    if spec.min_year == -math.inf and spec.max_year == math.inf:
+                        matches.append(spec.id)
+                elif spec.min_year <= year <= spec.max_year:
+                    matches.append(spec.id)
+        return matches
+
+    def match_car(self, car):
+        return self.match(*car_values(car))
+
+
+def search_version():
+    """
+    Changes whenever a saved search is created, edited or deleted. Read
+    from the database, since searches are saved by the web workers and
+    matched by a separate process that shares no cache with them.
+    """
+    return tuple(SavedSearch.objects.aggregate(count=Count('id'), updated=Max('updated_at')).values())
+
+
+def build_index():
+    rows = SavedSearch.objects.filter(is_active=True).values(
+        'id', *CATEGORICAL, 'min_price', 'max_price', 'min_year', 'max_year'
+    )
+    return SavedSearchIndex(spec_from_row(row) for row in rows.iterator(chunk_size=5000))
+
+
+_index = None
+_index_version = None
+
+
+def get_index():
+    """The process-wide index, rebuilt only after saved searches change (one aggregate query per call)."""
+    global _index, _index_version
+    version = search_version()
+    if _index is None or _index_version != version:
+        _index, _index_version = build_index(), version
+    return _index
+
+
+def _alert_body(cars):
+    car_url = _config().get('car_url', 'https://cheapridesgh.com/cars/{slug}')
+    lines = [f"- {car.title}, GHS {car.price}: {car_url.format(slug=car.slug)}" for car in cars]
+    return "New cars matching your saved searches:\n\n" + "\n".join(lines)
+
+
+def process_pending(batch_size=None):
+    """
+    Match one batch of newly listed cars and queue one digest email per
+    recipient in the outbox. Returns (cars matched, emails queued).
+    """
+    batch_size = batch_size or _config().get('batch_size', 200)
+    index = get_index()
+    with transaction.atomic():
+        pending = list(
+            PendingCarMatch.objects.select_for_update(skip_locked=True)
+            .values_list('id', 'car_id')[:batch_size]
+        )
+        if not pending:
+            return 0, 0
+        cars = Car.objects.filter(id__in=[car_id for _, car_id in pending], is_available=True)
+
+        cars_by_search = defaultdict(list)
+        for car in cars:
+            for search_id in index.match_car(car):
+                cars_by_search[search_id].append(car)
+
+        # One digest per address, however many of its searches matched.
+        cars_by_email = defaultdict(dict)
+        searches = SavedSearch.objects.filter(id__in=cars_by_search, is_active=True).values_list('id', 'email')
+        for search_id, email in searches:
+            for car in cars_by_search[search_id]:
+                cars_by_email[email][car.id] = car
+
+        for email, matched in cars_by_email.items():
+            count = len(matched)
+            subject = f"{count} new car{'s match' if count != 1 else ' matches'} your saved searches"
+            enqueue_email(email, subject, _alert_body(matched.values()), kind='saved_search')
+        SavedSearch.objects.filter(id__in=cars_by_search).update(last_notified_at=timezone.now())
+        PendingCarMatch.objects.filter(id__in=[pending_id for pending_id, _ in pending]).delete()
+    return len(pending), len(cars_by_email)
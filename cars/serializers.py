@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Car, CarImage
+from .models import Car, CarImage, SavedSearch
 from django.contrib.auth.models import User
 
 class UserSerializer(serializers.ModelSerializer):
@@ -67,3 +67,22 @@ class CarCreateSerializer(serializers.ModelSerializer):
         ]
 
 
+class SavedSearchSerializer(serializers.ModelSerializer):
+    email = serializers.EmailField(required=False)
+
+    class Meta:
+        model = SavedSearch
+        fields = [
+            'id', 'name', 'email', 'make', 'fuel_type', 'transmission', 'body_style',
+            'min_price', 'max_price', 'min_year', 'max_year', 'is_active',
+            'created_at', 'last_notified_at'
+        ]
+        read_only_fields = ['created_at', 'last_notified_at']
+
+    def validate(self, data):
+        for low, high in (('min_price', 'max_price'), ('min_year', 'max_year')):
+            low_value = data.get(low, getattr(self.instance, low, None))
+            high_value = data.get(high, getattr(self.instance, high, None))
+            if low_value is not None and high_value is not None and low_value > high_value:
+                raise serializers.ValidationError({low: f"{low} cannot be greater than {high}"})
+        return data
@@ -0,0 +1,89 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .duplicates import fingerprint_source
+from .inventory import bump_inventory_version
+from .models import Car, CarImage, CarTombstone, ListingFingerprint, PendingCarMatch
+from .valuation import mark_stale
+from .snapshots import schedule_publish
+
+
+@receiver(post_save, sender=Car)
+@receiver(post_delete, sender=Car)
+@receiver(post_save, sender=CarImage)
+@receiver(post_delete, sender=CarImage)
+def inventory_changed(sender, **kwargs):
+    bump_inventory_version()
+
+
+@receiver(post_save, sender=Car)
+@receiver(post_delete, sender=Car)
+def car_changed(sender, instance, **kwargs):
+    slug = instance.slug
+    transaction.on_commit(lambda: schedule_publish(slug))
+
+
+@receiver(post_delete, sender=Car)
+def record_tombstone(sender, instance, **kwargs):
+    CarTombstone.objects.create(car_id=instance.id, slug=instance.slug)
+
+
+@receiver(post_save, sender=CarImage)
+@receiver(post_delete, sender=CarImage)
+def touch_car(sender, instance, **kwargs):
+    # Keeps Car.updated_at meaningful for the change feed when only the
+    # gallery changes. update() doesn't fire signals, so this can't loop.
+    Car.objects.filter(id=instance.car_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=CarImage)
+@receiver(post_delete, sender=CarImage)
+def car_image_changed(sender, instance, **kwargs):
+    slug = Car.objects.filter(id=instance.car_id).values_list('slug', flat=True).first()
+    if slug:
+        transaction.on_commit(lambda: schedule_publish(slug))
+
+
+@receiver(pre_save, sender=Car)
+def remember_availability(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Lets queue_saved_search_match tell a car being published from one
+    # that was already public (None: not saved before).
+    if instance.pk is None:
+        instance._was_available = None
+    elif raw or (update_fields is not None and 'is_available' not in update_fields):
+        instance._was_available = True
+    else:
+        instance._was_available = Car.objects.filter(pk=instance.pk).values_list('is_available', flat=True).first()
+
+
+@receiver(post_save, sender=Car)
+def queue_saved_search_match(sender, instance, **kwargs):
+    # Matched and mailed by `manage.py match_saved_searches`, never inline.
+    # Both new public cars and hidden ones being published are queued.
+    if instance.is_available and not getattr(instance, '_was_available', True):
+        PendingCarMatch.objects.get_or_create(car=instance)
+
+
+@receiver(post_save, sender=Car)
+@receiver(post_delete, sender=Car)
+def valuation_changed(sender, instance, **kwargs):
+    # Recomputed by `manage.py refresh_valuations`. A car moved to another
+    # make/model leaves its old segments to the next --full refresh.
+    mark_stale(instance.make, instance.model)
+
+
+@receiver(post_save, sender=Car)
+def car_fingerprint_changed(sender, instance, **kwargs):
+    # Only a change to the text or main image makes the fingerprint stale;
+    # price, availability and other edits keep it.
+    ListingFingerprint.objects.filter(car_id=instance.id).exclude(source=fingerprint_source(instance)).delete()
+
+
+@receiver(post_save, sender=CarImage)
+@receiver(post_delete, sender=CarImage)
+def fingerprint_changed(sender, instance, **kwargs):
+    # Dropping the fingerprint (and its LSH buckets) stops stale images from
+    # matching; `manage.py find_duplicates` recomputes it.
+    ListingFingerprint.objects.filter(car_id=instance.car_id).delete()
@@ -0,0 +1,210 @@
+import atexit
+import gzip
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections
+from rest_framework.renderers import JSONRenderer
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .models import Car
+from .serializers import CarDetailSerializer, CarListSerializer
+
+try:
+    import brotli
+except ImportError:  # optional: gzip alone is enough for WhiteNoise
+    brotli = None
+
+# Static JSON snapshots of the public catalogue, written whenever inventory
+# changes and served by SnapshotWhiteNoiseMiddleware without reaching Django
+# views or the database:
+#
+#     <url>/list.json, featured.json, recent.json, cars/<slug>.json
+#
+# Every file is written next to its .gz (and .br when brotli is installed)
+# variant with write-then-rename, so readers never see a partial file.
+
+RECENT_COUNT = 8
+
+
+def _config():
+    return getattr(settings, 'CARS_SNAPSHOTS', {})
+
+
+def snapshot_root():
+    return Path(_config().get('root', Path(settings.BASE_DIR) / 'snapshots'))
+
+
+def snapshot_url():
+    return _config().get('url', '/snapshots/')
+
+
+def _atomic_write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def write_snapshot(relative_path, data):
+    path = snapshot_root() / relative_path
+    body = JSONRenderer().render(data)
+    # Compressed variants first, so the plain file never appears without them.
+    _atomic_write(path.with_name(path.name + '.gz'), gzip.compress(body, mtime=0))
+    if brotli is not None:
+        _atomic_write(path.with_name(path.name + '.br'), brotli.compress(body))
+    _atomic_write(path, body)
+
+
+def remove_snapshot(relative_path):
+    path = snapshot_root() / relative_path
+    for suffix in ('', '.gz', '.br'):
+        try:
+            os.unlink(path.with_name(path.name + suffix))
+        except FileNotFoundError:
+            pass
+
+
+def publish_lists():
+    """
+    Rewrite list.json, featured.json and recent.json. list.json is the
+    whole public catalogue, so every publish re-serializes every available
+    car whatever changed; the debounce keeps that to once per burst of
+    changes, but its cost grows with the inventory, not the change.
+    """
+    available = Car.objects.filter(is_available=True)
+    write_snapshot('list.json', CarListSerializer(available, many=True).data)
+    write_snapshot('featured.json', CarListSerializer(available.filter(is_featured=True), many=True).data)
+    write_snapshot('recent.json', CarListSerializer(available[:RECENT_COUNT], many=True).data)
+
+
+def publish_details(slugs):
+    cars = {
+        car.slug: car
+        for car in Car.objects.filter(is_available=True, slug__in=slugs).prefetch_related('additional_images')
+    }
+    for slug in slugs:
+        if slug in cars:
+            write_snapshot(f'cars/{slug}.json', CarDetailSerializer(cars[slug]).data)
+        else:
+            remove_snapshot(f'cars/{slug}.json')
+
+
+def publish_all():
+    """Full rebuild; also prunes details of cars that are gone or renamed."""
+    publish_lists()
+    cars = Car.objects.filter(is_available=True).prefetch_related('additional_images')
+    published = set()
+    for car in cars.iterator(chunk_size=500):
+        write_snapshot(f'cars/{car.slug}.json', CarDetailSerializer(car).data)
+        published.add(f'{car.slug}.json')
+
+    details_dir = snapshot_root() / 'cars'
+    if details_dir.is_dir():
+        for entry in details_dir.iterdir():
+            name = entry.name
+            for suffix in ('.gz', '.br'):
+                name = name.removesuffix(suffix)
+            if name not in published:
+                entry.unlink()
+    return len(published)
+
+
+class SnapshotPublisher:
+    """
+    Debounces inventory changes: slugs touched within `delay` seconds of
+    each other are published together by one background timer.
+    """
+
+    def __init__(self, delay):
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._timer = None
+
+    def schedule(self, slug):
+        with self._lock:
+            self._pending.add(slug)
+            if self._timer is None:
+                self._timer = threading.Timer(self.delay, self._flush_from_timer)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            slugs, self._pending = self._pending, set()
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = None
+        if slugs:
+            publish_lists()
+            publish_details(slugs)
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        finally:
+            # The timer thread's own connection, not the caller's.
+            close_old_connections()
+
+
+_publisher = None
+_publisher_lock = threading.Lock()
+
+
+def schedule_publish(slug):
+    global _publisher
+    if not _config().get('enabled'):
+        return
+    with _publisher_lock:
+        if _publisher is None:
+            _publisher = SnapshotPublisher(_config().get('debounce_seconds', 2.0))
+            # The timer is a daemon thread, so a management command would
+            # otherwise exit before it fires.
+            atexit.register(flush_pending)
+    _publisher.schedule(slug)
+
+
+def flush_pending():
+    """Publish scheduled changes now instead of waiting for the debounce timer."""
+    if _publisher is not None:
+        _publisher.flush()
+
+
+class SnapshotWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise, plus the snapshot directory. Snapshots are replaced while the
+    process runs, so they are looked up per request instead of from the
+    startup index used for collected static files.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.snapshot_url = snapshot_url()
+        self.snapshot_root = str(snapshot_root())
+        super().__init__(*args, **kwargs)
+
+    def __call__(self, request):
+        path = request.path_info
+        if path.startswith(self.snapshot_url) and self.url_is_canonical(path):
+            relative = path[len(self.snapshot_url):]
+            file_path = os.path.join(self.snapshot_root, relative)
+            if relative and not self.is_compressed_variant(file_path) and os.path.isfile(file_path):
+                return self.serve(self.get_static_file(file_path, path), request)
+        return super().__call__(request)
+
+    def add_cache_headers(self, headers, path, url):
+        if url.startswith(self.snapshot_url):
+            headers['Cache-Control'] = 'public, max-age={}'.format(_config().get('max_age', 60))
+        else:
+            super().add_cache_headers(headers, path, url)
@@ -0,0 +1,816 @@
+import json
+import shutil
+import tempfile
+import unittest
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail import EmailMessage
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.db.models.signals import post_delete, post_save
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import (
+    admission, archive, changes, duplicates, home, inventory, outbox, popularity, query_audit, saved_searches,
+    signals, snapshots, uploads, valuation, views,
+)
+from .admin import CarImageInline, EstimatedCountPaginator
+from .benchmarks import seed_cars
+from .models import (
+    ArchivedCar, Car, CarImage, CarTombstone, CarViewStats, DuplicateCandidate, OutboundEmail, PendingCarMatch,
+    PriceSegment, SavedSearch,
+)
+from .routers import REPLICA_ALIAS
+
+NO_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+LOCAL_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'cars-tests'}}
+
+
+def get(client, path, **headers):
+    return client.get(path, HTTP_HOST='localhost', **headers)
+
+
+@override_settings(CACHES=NO_CACHE, CARS_POPULARITY={'enabled': False})
+class ReplicaRoutingTests(TestCase):
+    """The replica is a separate SQLite database, so a response shows which one was read."""
+
+    # Resolved in setUpClass, once the replica is registered.
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        # connections.settings is settings.DATABASES, with defaults filled in.
+        cls.enterClassContext(mock.patch.dict(
+            settings.DATABASES, {REPLICA_ALIAS: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ''}}
+        ))
+        connections.configure_settings(settings.DATABASES)
+        replica = connections[REPLICA_ALIAS]
+        cls.addClassCleanup(connections.__delitem__, REPLICA_ALIAS)
+        cls.addClassCleanup(replica.creation.destroy_test_db, replica.settings_dict['NAME'], verbosity=0)
+        replica.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_cars(2, available_ratio=1, prefix='routing')
+        # routing-0 exists on both databases, routing-1 only on the primary
+        # (the replica hasn't caught up yet).
+        Car.objects.using(REPLICA_ALIAS).bulk_create([Car.objects.get(slug='routing-0')])
+        cls.staff = User.objects.create(username='routing-staff', email='staff@example.com', is_staff=True)
+
+    def get(self, client, slug):
+        return client.get(f'/api/cars/{slug}/', HTTP_HOST='localhost').status_code
+
+    def test_public_reads_use_the_replica(self):
+        client = APIClient()
+        self.assertEqual(self.get(client, 'routing-0'), 200)
+        self.assertEqual(self.get(client, 'routing-1'), 404)
+
+    def test_staff_write_pins_reads_to_the_primary(self):
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        response = client.post('/api/saved-searches/', {'make': 'toyota'}, format='json', HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('pin_primary', response.cookies)
+        self.assertEqual(self.get(client, 'routing-1'), 200)
+
+        client.cookies.pop('pin_primary')
+        self.assertEqual(self.get(client, 'routing-1'), 404)
+
+    def test_non_staff_writes_do_not_pin(self):
+        user = User.objects.create(username='routing-buyer', email='buyer@example.com')
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.post('/api/saved-searches/', {'make': 'toyota'}, format='json', HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('pin_primary', response.cookies)
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class OutboxTests(TestCase):
+    def test_drain_sends_due_emails_in_batches(self):
+        first = outbox.enqueue_email('a@example.com', 'First', 'Hello')
+        outbox.enqueue_email('b@example.com', 'Second', 'Hello again')
+
+        self.assertEqual(outbox.drain_outbox(batch_size=1), (1, 0))
+        self.assertEqual(outbox.drain_outbox(batch_size=1), (1, 0))
+        self.assertEqual(outbox.drain_outbox(), (0, 0))
+
+        self.assertEqual([(message.to, message.subject) for message in mail.outbox], [
+            (['a@example.com'], 'First'), (['b@example.com'], 'Second'),
+        ])
+        first.refresh_from_db()
+        self.assertEqual((first.status, first.attempts), ('sent', 1))
+        self.assertIsNotNone(first.sent_at)
+
+    def test_failed_send_backs_off(self):
+        email = outbox.enqueue_email('a@example.com', 'First', 'Hello')
+        with mock.patch.object(EmailMessage, 'send', side_effect=OSError('connection reset')), self.assertLogs('cars.outbox'):
+            self.assertEqual(outbox.drain_outbox(), (0, 1))
+
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts, email.last_error), ('pending', 1, 'connection reset'))
+        # Not due again until the backoff has passed.
+        self.assertEqual(outbox.drain_outbox(), (0, 0))
+        OutboundEmail.objects.filter(pk=email.pk).update(next_attempt_at=email.created_at)
+        self.assertEqual(outbox.drain_outbox(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+
+
+@override_settings(CACHES=NO_CACHE)
+class LocalUploadTests(TestCase):
+    car = {
+        'title': 'Uploaded Camry', 'description': 'Clean', 'price': '12000', 'make': 'toyota', 'model': 'Camry',
+        'year': '2020', 'mileage': 30000, 'fuel_type': 'petrol', 'transmission': 'automatic',
+        'condition': 'used', 'color': 'Silver', 'is_available': True,
+    }
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        self.enterContext(override_settings(CARS_UPLOADS={**settings.CARS_UPLOADS, 'backend': 'local', 'local_root': root}))
+        self.admin = APIClient()
+        self.admin.force_authenticate(User.objects.create(username='uploads-staff', is_staff=True))
+        self.storage = APIClient()
+
+    def post(self, client, path, data, **kwargs):
+        return client.post(path, data, HTTP_HOST='localhost', **kwargs)
+
+    def upload(self, count):
+        signed = self.post(self.admin, '/api/admin/uploads/sign/', {'count': count}, format='json').json()
+        self.assertEqual(signed['upload_url'], 'http://localhost/api/uploads/local/')
+        responses = []
+        for fields in signed['uploads']:
+            response = self.post(self.storage, '/api/uploads/local/', {
+                **fields, 'file': SimpleUploadedFile('car.png', b'not really a png'),
+            }, format='multipart')
+            self.assertEqual(response.status_code, 200)
+            responses.append(response.json())
+        return signed['uploads'], responses
+
+    def finalize(self, **data):
+        return self.post(self.admin, '/api/admin/uploads/finalize/', data, format='json')
+
+    def test_sign_upload_finalize(self):
+        _, (main, *gallery) = self.upload(3)
+        response = self.finalize(car=self.car, main_image=main, gallery_images=gallery)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['images'], 2)
+
+        car = Car.objects.get(pk=response.json()['car_id'])
+        self.assertEqual(car.main_image.public_id, main['public_id'])
+        self.assertEqual(
+            sorted(image.image.public_id for image in car.additional_images.all()),
+            sorted(upload['public_id'] for upload in gallery),
+        )
+
+    def test_rejects_tampered_and_reused_uploads(self):
+        fields, (main,) = self.upload(1)
+        tampered = self.post(self.storage, '/api/uploads/local/', {
+            **fields[0], 'public_id': 'cars/images/other', 'file': SimpleUploadedFile('car.png', b'x'),
+        }, format='multipart')
+        self.assertEqual(tampered.status_code, 400)
+
+        forged = self.finalize(car=self.car, main_image={**main, 'version': main['version'] + 1})
+        self.assertEqual(forged.status_code, 400)
+
+        car_id = self.finalize(car=self.car, main_image=main).json()['car_id']
+        replayed = self.finalize(car_id=car_id, gallery_images=[main])
+        self.assertEqual(replayed.status_code, 400)
+        self.assertIn('already attached', replayed.json()['error'])
+
+    def test_finalize_validates_car_id(self):
+        self.assertEqual(self.finalize(car_id='abc').status_code, 400)
+        self.assertEqual(self.finalize(car_id=0).status_code, 404)
+
+    def test_local_backend_only(self):
+        with override_settings(CARS_UPLOADS={**settings.CARS_UPLOADS, 'backend': 'cloudinary'}):
+            self.assertEqual(uploads.get_backend().name, 'cloudinary')
+            self.assertEqual(self.post(self.storage, '/api/uploads/local/', {}).status_code, 404)
+
+
+@override_settings(CACHES=NO_CACHE, CARS_POPULARITY={'enabled': False})
+class ArchiveTests(TestCase):
+    def setUp(self):
+        seed_cars(3, available_ratio=0, prefix='archive')
+        long_ago = timezone.now() - timedelta(days=200)
+        Car.objects.filter(slug__in=['archive-0', 'archive-1']).update(updated_at=long_ago)
+        Car.objects.filter(slug='archive-2').update(updated_at=timezone.now())
+
+    def test_archive_and_restore(self):
+        car = Car.objects.get(slug='archive-0')
+        self.assertEqual(archive.archive_cars(after_days=90), 2)
+        self.assertEqual(list(Car.objects.values_list('slug', flat=True)), ['archive-2'])
+        self.assertTrue(CarTombstone.objects.filter(car_id=car.id).exists())
+
+        response = APIClient().get('/api/cars/archive-0/', HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 410)
+        self.assertTrue(response.json()['archived'])
+
+        restored = archive.restore_car('archive-0')
+        self.assertEqual((restored.id, restored.is_available), (car.id, False))
+        self.assertFalse(ArchivedCar.objects.filter(slug='archive-0').exists())
+        # The restored car's clock starts again.
+        self.assertFalse(archive.archivable(90).filter(id=car.id).exists())
+
+    def test_repeated_slug(self):
+        archive.archive_cars(after_days=90)
+        # Relisted under the same slug, then hidden long enough to archive.
+        seed_cars(1, available_ratio=0, prefix='archive', seed=1)
+        relisted = Car.objects.get(slug='archive-0')
+        Car.objects.filter(id=relisted.id).update(updated_at=timezone.now() - timedelta(days=200))
+
+        self.assertEqual(archive.archive_cars(after_days=90), 1)
+        self.assertEqual(ArchivedCar.objects.filter(slug='archive-0').count(), 2)
+        self.assertEqual(archive.restore_car('archive-0').id, relisted.id)
+        with self.assertRaises(archive.RestoreConflict):
+            archive.restore_car('archive-0')
+
+    def test_limited_to_given_cars(self):
+        self.assertEqual(archive.archive_cars(after_days=90, cars=Car.objects.filter(slug='archive-1')), 1)
+        self.assertTrue(Car.objects.filter(slug='archive-0').exists())
+
+
+@override_settings(CACHES=NO_CACHE, CARS_POPULARITY={'enabled': False})
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        # Seeded timestamps are in the past, so later changes land in a new second.
+        seed_cars(3, available_ratio=1, prefix='conditional')
+        self.client = APIClient()
+
+    def validators(self, path):
+        response = get(self.client, path)
+        self.assertEqual(response.status_code, 200)
+        return {'HTTP_IF_NONE_MATCH': response['ETag'], 'HTTP_IF_MODIFIED_SINCE': response['Last-Modified']}
+
+    def assertRevalidates(self, path, headers, status):
+        for name, value in headers.items():
+            self.assertEqual(get(self.client, path, **{name: value}).status_code, status, name)
+
+    def test_list_not_modified(self):
+        self.assertRevalidates('/api/cars/', self.validators('/api/cars/'), 304)
+
+    def test_hiding_a_car_modifies_the_list(self):
+        headers = self.validators('/api/cars/')
+        car = Car.objects.get(slug='conditional-1')
+        car.is_available = False
+        car.save()
+        self.assertRevalidates('/api/cars/', headers, 200)
+
+    def test_deleting_a_car_modifies_the_list(self):
+        headers = self.validators('/api/cars/')
+        Car.objects.get(slug='conditional-1').delete()
+        self.assertRevalidates('/api/cars/', headers, 200)
+
+    def test_detail(self):
+        path = '/api/cars/conditional-0/'
+        self.assertRevalidates(path, self.validators(path), 304)
+        Car.objects.filter(slug='conditional-0').update(is_available=False)
+        self.assertEqual(get(self.client, path).status_code, 404)
+
+    def test_gallery_changes_modify_the_detail_etag(self):
+        # Without touch_car, so the validator has to see images itself.
+        path = '/api/cars/conditional-0/'
+        for signal in (post_save, post_delete):
+            signal.disconnect(signals.touch_car, sender=CarImage)
+            self.addCleanup(signal.connect, signals.touch_car, sender=CarImage)
+        car = Car.objects.get(slug='conditional-0')
+        old = CarImage.objects.create(car=car, image='cars/images/old.jpg')
+        CarImage.objects.filter(id=old.id).update(created_at=timezone.now() - timedelta(days=1))
+
+        etag = self.validators(path)['HTTP_IF_NONE_MATCH']
+        CarImage.objects.create(car=car, image='cars/images/new.jpg')
+        self.assertEqual(get(self.client, path, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # Removing an older image leaves the latest created_at as it was.
+        etag = self.validators(path)['HTTP_IF_NONE_MATCH']
+        old.delete()
+        self.assertEqual(get(self.client, path, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class QueryAuditTests(TestCase):
+    def test_every_get_route_is_requested(self):
+        seed_cars(20, available_ratio=1, prefix='audit')
+        user = User.objects.create(username='audit-staff', email='audit@example.com', is_staff=True)
+        with self.assertLogs('django.request', 'WARNING'):
+            results = {path: status for path, status, _ in query_audit.exercise_routes(user, query_audit.sample_objects(user))}
+
+        token = OutboundEmail.objects.get().token
+        self.assertEqual(results[f'/api/send-verification/{token}/'], 200)
+        self.assertEqual(results['/api/send-verification/'], query_audit.POST_ONLY)
+        self.assertEqual(results['/api/admin/uploads/finalize/'], query_audit.POST_ONLY)
+        self.assertEqual(results['/api/cars/audit-0/'], 200)
+
+    def test_unsupported_backend(self):
+        with mock.patch.object(connections['default'], 'vendor', 'oracle'):
+            self.assertEqual(query_audit.explain('default', 'SELECT 1', ()), [(query_audit.UNSUPPORTED, 'oracle')])
+            with self.assertRaisesMessage(CommandError, "Can't read query plans on oracle"):
+                call_command('audit_queries', rows=1)
+
+    def test_index_columns(self):
+        sql = 'SELECT * FROM "cars_car" WHERE ("cars_car"."make" = %s AND "cars_car"."price" >= %s) ORDER BY "cars_car"."year" DESC'
+        self.assertEqual(query_audit.index_columns(sql, 'cars_car'), ['make', 'price'])
+        self.assertEqual(query_audit.index_columns(sql, 'cars_car', unique={'make'}), [])
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class AdmissionTests(TestCase):
+    route = 'send_verification_email'
+
+    def setUp(self):
+        admission.reset()
+        self.addCleanup(admission.reset)
+        self.addCleanup(caches['default'].clear)
+
+    def send(self):
+        return APIClient().post(
+            '/api/send-verification/', {'email': 'buyer@example.com'}, format='json', HTTP_HOST='localhost',
+        )
+
+    def test_shared_store_is_the_default(self):
+        self.assertEqual(settings.CARS_ADMISSION['backend'], 'cache')
+        with override_settings(CARS_ADMISSION={}):
+            admission.reset()
+            self.assertIsInstance(admission.get_store(), admission.CacheStore)
+
+    def test_sheds_over_the_concurrency_limit(self):
+        policy = {'concurrency': 1, 'retry_after': 7}
+        with override_settings(CARS_ADMISSION={'backend': 'cache', 'routes': {self.route: policy}}):
+            # Another worker holds the only slot.
+            self.assertTrue(admission.get_store().acquire(self.route, 1))
+            with self.assertLogs('django.request', 'ERROR'):
+                response = self.send()
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response['Retry-After'], '7')
+
+            admission.get_store().release(self.route)
+            self.assertEqual(self.send().status_code, 202)
+            self.assertEqual(admission.stats()[self.route], {'admitted': 1, 'throttled': 0, 'shed': 1, 'in_flight': 0})
+
+    def test_throttles_over_the_rate(self):
+        with override_settings(CARS_ADMISSION={'backend': 'cache', 'routes': {self.route: {'rate': 0.5, 'burst': 1}}}):
+            self.assertEqual(self.send().status_code, 202)
+            with self.assertLogs('django.request', 'WARNING'):
+                response = self.send()
+            self.assertEqual(response.status_code, 429)
+            self.assertGreaterEqual(int(response['Retry-After']), 1)
+
+
+@override_settings(CACHES=NO_CACHE, CARS_POPULARITY={'enabled': False})
+class SavedSearchTests(TestCase):
+    car = {
+        'title': 'Alert Camry', 'description': 'Clean', 'price': 12000, 'main_image': 'cars/images/camry.jpg',
+        'make': 'toyota', 'model': 'Camry', 'year': '2020', 'mileage': 30000, 'fuel_type': 'petrol',
+        'transmission': 'automatic', 'color': 'Silver',
+    }
+
+    def setUp(self):
+        user = User.objects.create(username='alerts-buyer', email='buyer@example.com')
+        SavedSearch.objects.create(user=user, email='buyer@example.com', make='toyota', max_price=15000)
+        SavedSearch.objects.create(user=user, email='other@example.com', make='honda')
+
+    def test_new_public_car_is_matched(self):
+        Car.objects.create(slug='alert-camry', **self.car)
+        self.assertEqual(saved_searches.process_pending(), (1, 1))
+        email = OutboundEmail.objects.get()
+        self.assertEqual((email.recipient, email.kind, email.subject), (
+            'buyer@example.com', 'saved_search', '1 new car matches your saved searches',
+        ))
+        self.assertFalse(PendingCarMatch.objects.exists())
+
+    def test_hidden_car_is_queued_when_published(self):
+        car = Car.objects.create(slug='alert-camry', **{**self.car, 'is_available': False})
+        self.assertFalse(PendingCarMatch.objects.exists())
+
+        car.is_available = True
+        car.save()
+        self.assertTrue(PendingCarMatch.objects.filter(car=car).exists())
+
+    def test_edits_to_public_cars_are_not_queued(self):
+        car = Car.objects.create(slug='alert-camry', **self.car)
+        PendingCarMatch.objects.all().delete()
+        car.price = 11000
+        car.save()
+        with CaptureQueriesContext(connections['default']) as queries:
+            car.save(update_fields=['price'])
+        # The old is_available is only read when it is being saved.
+        self.assertFalse([query for query in queries if 'SELECT "cars_car"."is_available"' in query['sql']])
+        self.assertFalse(PendingCarMatch.objects.exists())
+
+
+class SnapshotTestMixin:
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root)
+        # Long enough that only an explicit flush publishes.
+        self.enterContext(override_settings(CARS_SNAPSHOTS={'enabled': True, 'root': self.root, 'debounce_seconds': 60}))
+        self.enterContext(mock.patch.object(snapshots, '_publisher', None))
+        self.addCleanup(snapshots.flush_pending)
+        seed_cars(2, available_ratio=1, prefix='snapshot')
+
+    def published(self):
+        return [car['slug'] for car in json.loads((self.root / 'list.json').read_text())]
+
+
+@override_settings(CACHES=NO_CACHE, CARS_POPULARITY={'enabled': False})
+class SnapshotTests(SnapshotTestMixin, TestCase):
+    def test_changes_are_published_on_flush(self):
+        car = Car.objects.get(slug='snapshot-0')
+        with self.captureOnCommitCallbacks(execute=True):
+            car.title = 'Renamed'
+            car.save()
+        self.assertFalse((self.root / 'list.json').exists())
+
+        snapshots.flush_pending()
+        self.assertCountEqual(self.published(), ['snapshot-0', 'snapshot-1'])
+        self.assertEqual(json.loads((self.root / 'cars/snapshot-0.json').read_text())['title'], 'Renamed')
+        self.assertTrue((self.root / 'cars/snapshot-0.json.gz').exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            car.is_available = False
+            car.save()
+        snapshots.flush_pending()
+        self.assertEqual(self.published(), ['snapshot-1'])
+        self.assertFalse((self.root / 'cars/snapshot-0.json').exists())
+
+
+@override_settings(CACHES=NO_CACHE, CARS_POPULARITY={'enabled': False})
+class SnapshotCommandTests(SnapshotTestMixin, TransactionTestCase):
+    # Archived cars leave the snapshots when archive_cars commits, which
+    # TestCase's wrapping transaction would postpone.
+
+    def test_archive_command_publishes_before_exiting(self):
+        Car.objects.filter(slug='snapshot-0').update(is_available=False, updated_at=timezone.now() - timedelta(days=200))
+        call_command('archive_cars', after_days=90, stdout=StringIO())
+        self.assertEqual(self.published(), ['snapshot-1'])
+
+
+@override_settings(CACHES=LOCAL_CACHE, CARS_POPULARITY={'enabled': True})
+class PopularityTests(TestCase):
+    def setUp(self):
+        seed_cars(2, available_ratio=1, prefix='popular')
+        self.car = Car.objects.get(slug='popular-0')
+        self.addCleanup(caches['default'].clear)
+        # Flushed by hand instead of from timers.
+        self.enterContext(mock.patch('cars.popularity.threading.Timer'))
+        self.counter = popularity.ViewCounter(popularity.MemoryBuffer(), flush_seconds=60, max_pending=1000)
+        self.enterContext(mock.patch.object(popularity, '_counter', self.counter))
+
+    def views(self):
+        return CarViewStats.objects.get(car=self.car).views
+
+    def test_repeat_visits_are_counted(self):
+        client = APIClient()
+        path = '/api/cars/popular-0/'
+        etag = get(client, path)['ETag']
+        self.assertEqual(get(client, path, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.counter.flush()
+        self.assertEqual(self.views(), 2)
+
+    def test_flush_is_idempotent(self):
+        for _ in range(3):
+            popularity.record_view(self.car.id)
+        self.counter.flush()
+        self.counter.flush(final=True)
+        self.assertEqual(self.views(), 3)
+
+        popularity.record_view(self.car.id)
+        self.counter.flush()
+        self.assertEqual(self.views(), 4)
+
+    def test_cache_windows_are_claimed_once(self):
+        # Two workers sharing the cache; each reports what it counted.
+        first, second = popularity.CacheBuffer(window=60), popularity.CacheBuffer(window=60)
+        first.record(self.car.id)
+        second.record(self.car.id)
+        self.assertEqual(first.drain(final=True), {self.car.id: 2})
+        self.assertEqual(second.drain(final=True), {})
+        self.assertEqual(first.drain(final=True), {})
+
+
+@override_settings(CACHES=LOCAL_CACHE, CARS_POPULARITY={'enabled': False})
+class FacetTests(TestCase):
+    def setUp(self):
+        self.addCleanup(caches['default'].clear)
+        seed_cars(3, available_ratio=1, prefix='facet')
+        for slug, make, fuel_type in [('facet-0', 'toyota', 'petrol'), ('facet-1', 'toyota', 'diesel'), ('facet-2', 'honda', 'petrol')]:
+            Car.objects.filter(slug=slug).update(make=make, fuel_type=fuel_type)
+
+    def counts(self, path='/api/cars/facets/'):
+        response = get(APIClient(), path)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return data['total'], {facet['value']: facet['count'] for facet in data['make']}
+
+    def test_other_facets_ignore_their_own_selection(self):
+        self.assertEqual(self.counts(), (3, {'toyota': 2, 'honda': 1}))
+        # Picking a make still lists the other makes.
+        self.assertEqual(self.counts('/api/cars/facets/?make=honda'), (1, {'toyota': 2, 'honda': 1}))
+        self.assertEqual(self.counts('/api/cars/facets/?make=toyota&fuel_type=diesel'), (1, {'toyota': 1}))
+
+    def test_cached_until_inventory_changes(self):
+        key = inventory.versioned_key('facet-combinations')
+        self.counts()
+        with self.assertNumQueries(0):
+            self.counts()
+
+        car = Car.objects.get(slug='facet-2')
+        car.is_available = False
+        car.save()
+        self.assertNotEqual(inventory.versioned_key('facet-combinations'), key)
+        self.assertEqual(self.counts(), (2, {'toyota': 2}))
+
+        key = inventory.versioned_key('facet-combinations')
+        CarImage.objects.create(car=Car.objects.get(slug='facet-0'), image='cars/images/side.jpg')
+        self.assertNotEqual(inventory.versioned_key('facet-combinations'), key)
+
+
+@override_settings(CACHES=LOCAL_CACHE, CARS_POPULARITY={'enabled': False})
+class HomeTests(TestCase):
+    def setUp(self):
+        self.addCleanup(caches['default'].clear)
+        seed_cars(12, available_ratio=1, prefix='home')
+        ids = list(Car.objects.values_list('id', flat=True))
+        self.recent = ids[:home.RECENT_COUNT]
+        # One featured car among the newest, one older.
+        self.featured = [ids[0], ids[-1]]
+        Car.objects.update(is_featured=False)
+        Car.objects.filter(id__in=self.featured).update(is_featured=True)
+
+    def payload(self):
+        response = get(APIClient(), '/api/home/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_sections_share_serialized_cars(self):
+        payload = self.payload()
+        self.assertEqual(payload['recent'], self.recent)
+        self.assertEqual(payload['featured'], self.featured)
+        ids = [car['id'] for car in payload['cars']]
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertCountEqual(ids, set(self.recent) | set(self.featured))
+        self.assertEqual(sum(make['count'] for make in payload['makes']), 12)
+
+    def test_cached_until_inventory_changes(self):
+        self.payload()
+        with self.assertNumQueries(0):
+            self.payload()
+
+        car = Car.objects.get(id=self.recent[0])
+        car.is_available = False
+        car.save()
+        payload = self.payload()
+        self.assertNotIn(car.id, payload['recent'])
+        self.assertEqual(sum(make['count'] for make in payload['makes']), 11)
+
+
+@override_settings(CACHES=NO_CACHE, CARS_POPULARITY={'enabled': False})
+class ChangeFeedTests(TestCase):
+    def setUp(self):
+        seed_cars(5, available_ratio=1, prefix='feed')
+
+    def feed(self, since=None):
+        response = get(APIClient(), '/api/cars/changes/' + (f'?since={since}' if since else ''))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_changes_and_removals_since_token(self):
+        first = self.feed()
+        self.assertEqual(len(first['changed']), 5)
+        since = changes.encode_token(timezone.now() - timedelta(seconds=1))
+
+        edited, hidden = Car.objects.get(slug='feed-0'), Car.objects.get(slug='feed-1')
+        edited.price = 1000
+        edited.save()
+        hidden.is_available = False
+        hidden.save()
+        deleted_id = Car.objects.get(slug='feed-2').id
+        Car.objects.get(slug='feed-2').delete()
+
+        page = self.feed(since)
+        self.assertEqual([car['slug'] for car in page['changed']], ['feed-0'])
+        self.assertCountEqual(page['removed'], [
+            {'id': hidden.id, 'slug': 'feed-1', 'reason': 'hidden'},
+            {'id': deleted_id, 'slug': 'feed-2', 'reason': 'deleted'},
+        ])
+        self.assertFalse(page['has_more'])
+        # The next token trails now by the grace period, never behind `since`.
+        self.assertGreaterEqual(changes.decode_token(page['next'])[0], changes.decode_token(since)[0])
+
+    @override_settings(CARS_CHANGE_FEED={'limit': 2})
+    def test_pages_through_cars_sharing_a_timestamp(self):
+        moment = timezone.now() - timedelta(minutes=1)
+        Car.objects.update(updated_at=moment)
+        token, seen = changes.encode_token(moment - timedelta(seconds=1)), []
+        while True:
+            page = self.feed(token)
+            seen += [car['slug'] for car in page['changed']]
+            token = page['next']
+            if not page['has_more']:
+                break
+        self.assertCountEqual(seen, [f'feed-{i}' for i in range(5)])
+
+    def test_invalid_and_expired_tokens(self):
+        client = APIClient()
+        expired = changes.encode_token(timezone.now() - timedelta(days=365))
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(get(client, '/api/cars/changes/?since=not-a-token').status_code, 400)
+            self.assertEqual(get(client, f'/api/cars/changes/?since={expired}').status_code, 410)
+
+    def test_prune_tombstones(self):
+        Car.objects.get(slug='feed-0').delete()
+        Car.objects.get(slug='feed-1').delete()
+        CarTombstone.objects.filter(slug='feed-0').update(deleted_at=timezone.now() - timedelta(days=365))
+        self.assertEqual(changes.prune_tombstones(), 1)
+        self.assertEqual(list(CarTombstone.objects.values_list('slug', flat=True)), ['feed-1'])
+
+
+@override_settings(CACHES=NO_CACHE, CARS_POPULARITY={'enabled': False})
+class CarAdminTests(TestCase):
+    def setUp(self):
+        seed_cars(60, prefix='admin')
+        Car.objects.update(make='honda', description='Clean title, runs and drives.', primary_damage='Rear end')
+        Car.objects.filter(slug__in=['admin-0', 'admin-1', 'admin-2']).update(make='toyota')
+        Car.objects.filter(slug='admin-3').update(description='Flood damage on the rear axle.')
+        self.client.force_login(User.objects.create(username='admin-staff', is_staff=True, is_superuser=True))
+
+    def changelist(self, query=''):
+        response = self.client.get('/admin/cars/car/' + query, HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 200)
+        return response.context['cl']
+
+    def test_paginated_changelist(self):
+        cl = self.changelist()
+        self.assertEqual((cl.result_count, len(cl.result_list)), (60, 50))
+        self.assertEqual(len(self.changelist('?p=2').result_list), 10)
+
+    def test_prefix_search(self):
+        cl = self.changelist('?q=toy')
+        self.assertCountEqual([car.slug for car in cl.result_list], ['admin-0', 'admin-1', 'admin-2'])
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', 'Full-text search is PostgreSQL only')
+    def test_full_text_search(self):
+        cl = self.changelist('?q=flooded')
+        self.assertEqual([car.slug for car in cl.result_list], ['admin-3'])
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', 'Estimated counts are PostgreSQL only')
+    def test_estimated_count(self):
+        with mock.patch.object(EstimatedCountPaginator, 'exact_threshold', 0), CaptureQueriesContext(connection) as queries:
+            self.changelist()
+        sql = [query['sql'] for query in queries]
+        self.assertTrue(any(statement.startswith('EXPLAIN') for statement in sql))
+        self.assertFalse(any('COUNT(*)' in statement for statement in sql))
+
+    def test_inline_shows_newest_images(self):
+        car = Car.objects.get(slug='admin-0')
+        CarImage.objects.bulk_create([CarImage(car=car, image=f'cars/images/{i}.jpg') for i in range(12)])
+        response = self.client.get(f'/admin/cars/car/{car.id}/change/', HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 200)
+        formset = response.context['inline_admin_formsets'][0].formset
+        self.assertEqual(formset.initial_form_count(), CarImageInline.max_inline_images)
+
+
+@override_settings(CACHES=NO_CACHE, CARS_POPULARITY={'enabled': False})
+class CarBatchTests(TestCase):
+    def setUp(self):
+        seed_cars(3, available_ratio=1, prefix='batch')
+        Car.objects.filter(slug='batch-2').update(is_available=False)
+        self.client = APIClient()
+
+    def post(self, data):
+        return self.client.post('/api/cars/batch/', data, format='json', HTTP_HOST='localhost')
+
+    def test_keeps_order_and_reports_missing(self):
+        response = get(self.client, '/api/cars/batch/?slugs=batch-1,nope,batch-0,batch-1,batch-2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([car['slug'] for car in response.json()['cars']], ['batch-1', 'batch-0'])
+        # Hidden cars are as missing as unknown ones.
+        self.assertEqual(response.json()['missing'], ['nope', 'batch-2'])
+
+        self.assertEqual(self.post({'slugs': ['batch-0']}).json()['missing'], [])
+
+    def test_limits(self):
+        too_many = [f'batch-{i}' for i in range(views.CarBatchView.max_slugs + 1)]
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(get(self.client, '/api/cars/batch/?slugs=').status_code, 400)
+            self.assertEqual(self.post({'slugs': 'batch-0'}).status_code, 400)
+            self.assertEqual(self.post({'slugs': too_many}).status_code, 400)
+        # Duplicates count once.
+        self.assertEqual(self.post({'slugs': ['batch-0'] * (views.CarBatchView.max_slugs + 1)}).status_code, 200)
+
+    def test_one_query_for_the_cars(self):
+        # The cars, then their images.
+        with self.assertNumQueries(2):
+            get(self.client, '/api/cars/batch/?slugs=batch-0,batch-1')
+
+
+@override_settings(CACHES=NO_CACHE, CARS_POPULARITY={'enabled': False})
+class ValuationTests(TestCase):
+    def setUp(self):
+        seed_cars(10, available_ratio=1, prefix='value')
+        Car.objects.update(make='toyota', model='Camry', year='2018', condition='used', mileage=50000)
+        # Six comparable 2018s at 10000..15000, four 2025s too few for their own segments.
+        for i in range(10):
+            Car.objects.filter(slug=f'value-{i}').update(price=10000 + 1000 * i)
+        Car.objects.filter(slug__in=[f'value-{i}' for i in range(6, 10)]).update(year='2025', condition='new')
+
+    def car(self, **fields):
+        return {'make': 'Toyota', 'model': 'camry ', 'condition': 'used', 'year': '2018', 'mileage': 50000, 'price': 10000, **fields}
+
+    def test_most_specific_segment_with_enough_comparables(self):
+        self.assertEqual(valuation.refresh_all(), PriceSegment.objects.count())
+
+        result = valuation.valuation(self.car())
+        self.assertEqual((result['segment'], result['comparables']), (valuation.LEVELS[0], 6))
+        self.assertEqual((result['median'], result['position']), (12500.0, 'below_market'))
+        # Neighbouring years share the window.
+        self.assertEqual(valuation.valuation(self.car(year='2019', price=14000))['comparables'], 6)
+
+        fallback = valuation.valuation(self.car(condition='new', year='2025', price=16000))
+        self.assertEqual((fallback['segment'], fallback['comparables']), (valuation.LEVELS[3], 10))
+        self.assertIsNone(valuation.valuation(self.car(model='Corolla')))
+
+    def test_endpoint(self):
+        valuation.refresh_all()
+        response = get(APIClient(), '/api/cars/value-5/valuation/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['valuation']['position'], 'above_market')
+
+    def test_refresh_pending_recomputes_changed_models(self):
+        valuation.refresh_all()
+        car = Car.objects.get(slug='value-0')
+        car.price = 30000
+        car.save()
+        self.assertEqual(valuation.refresh_pending(), (1, PriceSegment.objects.count()))
+        self.assertEqual(valuation.refresh_pending(), (0, 0))
+        self.assertEqual(valuation.valuation(self.car())['median'], 13500.0)
+
+
+@override_settings(
+    CACHES=NO_CACHE, CARS_POPULARITY={'enabled': False},
+    # Text only: image hashes are fed to save_fingerprints directly below.
+    CARS_DUPLICATES={**settings.CARS_DUPLICATES, 'workers': 1, 'max_images': 0},
+)
+class DuplicateTests(TestCase):
+    listing = (
+        "Toyota Camry 2018 imported from the US, clean title, accident free, new tyres, "
+        "cold air conditioning, leather seats, reverse camera and push to start"
+    )
+
+    def setUp(self):
+        seed_cars(4, available_ratio=1, prefix='dupe')
+        self.cars = list(Car.objects.order_by('slug'))
+        texts = [self.listing, self.listing + ", call now", "Honda Civic 2012 manual, needs engine work", self.listing + ", negotiable"]
+        for car, text in zip(self.cars, texts):
+            Car.objects.filter(id=car.id).update(title='Toyota Camry', description=text, features='')
+        self.cars = list(Car.objects.order_by('slug'))
+
+    def pairs(self):
+        return {(candidate.car.slug, candidate.other.slug): candidate for candidate in DuplicateCandidate.objects.select_related('car', 'other')}
+
+    def test_reposted_listings_are_clustered(self):
+        self.assertEqual(duplicates.process_stale(), (4, 3))
+        pairs = self.pairs()
+        self.assertCountEqual(pairs, [('dupe-0', 'dupe-1'), ('dupe-0', 'dupe-3'), ('dupe-1', 'dupe-3')])
+        self.assertEqual({candidate.cluster for candidate in pairs.values()}, {self.cars[0].id})
+        self.assertEqual(duplicates.process_stale(), (0, 0))
+
+    def test_only_text_edits_refingerprint(self):
+        duplicates.process_stale()
+        car = Car.objects.get(slug='dupe-2')
+        car.price = 1000
+        car.save()
+        self.assertFalse(duplicates.stale_cars().exists())
+        car.description = self.listing
+        car.save()
+        self.assertEqual(list(duplicates.stale_cars()), [car])
+
+    def test_review_status_survives_a_rerun(self):
+        duplicates.process_stale()
+        DuplicateCandidate.objects.update(status='distinct')
+        call_command('find_duplicates', full=True, stdout=StringIO())
+        self.assertEqual(set(DuplicateCandidate.objects.values_list('status', flat=True)), {'distinct'})
+
+    def test_near_identical_images(self):
+        # Unrelated text signatures, so only the images can pair these cars:
+        # 4 bits apart for the first two, 40 for the third.
+        cars = self.cars[:3]
+        image = 0x0F0F_0F0F_0F0F_0F0F
+        results = [
+            (car.id, duplicates.fingerprint_source(car), duplicates.minhash(f'listing number {i} ' * 5), [image ^ flipped])
+            for i, (car, flipped) in enumerate(zip(cars, [0, 0b1111, (1 << 40) - 1]))
+        ]
+        self.assertEqual(duplicates.save_fingerprints(results), 1)
+        (candidate,) = DuplicateCandidate.objects.all()
+        self.assertEqual((candidate.image_distance, {candidate.car_id, candidate.other_id}), (4, {cars[0].id, cars[1].id}))
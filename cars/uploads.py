@@ -0,0 +1,204 @@
+import hmac
+import time
+import uuid
+from functools import reduce
+from operator import or_
+from pathlib import Path
+
+import cloudinary
+from cloudinary import CloudinaryResource
+from cloudinary.utils import api_sign_request
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import Q
+from django.urls import reverse
+
+from .models import Car, CarImage
+
+# Signed direct-to-storage uploads for the admin UI.
+#
+# Instead of posting image bytes through Django, the UI asks for signed
+# upload parameters (one fixed public_id per file), posts each file straight
+# to the storage backend, and then sends the backend's responses to the
+# finalize endpoint. A response carries a signature over (public_id,
+# version) made with the API secret, which proves the upload happened, so
+# the images can be attached without another round trip to the backend.
+# A response is accepted once: finalize rejects public_ids a car already uses.
+#
+# The 'cloudinary' backend talks to Cloudinary. The 'local' backend is a
+# stand-in for offline testing: LocalUploadView accepts the same signed
+# form post, stores the file under `local_root` and answers like Cloudinary.
+
+SIGNATURE_MAX_AGE = 3600  # Cloudinary rejects older upload signatures
+
+
+def _config():
+    return getattr(settings, 'CARS_UPLOADS', {})
+
+
+class InvalidUpload(Exception):
+    pass
+
+
+class CloudinaryUploads:
+    name = 'cloudinary'
+
+    @property
+    def api_key(self):
+        return cloudinary.config().api_key
+
+    @property
+    def api_secret(self):
+        return cloudinary.config().api_secret
+
+    def upload_url(self, request):
+        return f"https://api.cloudinary.com/v1_1/{cloudinary.config().cloud_name}/image/upload"
+
+
+class LocalUploads:
+    name = 'local'
+    api_key = 'local'
+
+    @property
+    def api_secret(self):
+        return settings.SECRET_KEY
+
+    def upload_url(self, request):
+        return request.build_absolute_uri(reverse('local-upload'))
+
+    def storage(self):
+        return FileSystemStorage(location=Path(_config().get('local_root', 'local_uploads')))
+
+
+def get_backend():
+    return LocalUploads() if _config().get('backend') == 'local' else CloudinaryUploads()
+
+
+def _sign(params, secret):
+    return api_sign_request(params, secret, cloudinary.config().signature_algorithm)
+
+
+def signed_params(count, request, backend=None):
+    """Upload URL and one set of signed form fields per file."""
+    backend = backend or get_backend()
+    folder = _config().get('folder', 'cars/images')
+    timestamp = int(time.time())
+    uploads = []
+    for _ in range(count):
+        params = {
+            'public_id': f"{folder}/{uuid.uuid4().hex}",
+            'timestamp': timestamp,
+            'allowed_formats': _config().get('allowed_formats', 'jpg,jpeg,png,webp'),
+        }
+        uploads.append({**params, 'api_key': backend.api_key, 'signature': _sign(params, backend.api_secret)})
+    return {'upload_url': backend.upload_url(request), 'uploads': uploads}
+
+
+def response_signature(public_id, version, backend=None):
+    """The signature the backend puts on its upload response."""
+    backend = backend or get_backend()
+    return api_sign_request(
+        {'public_id': public_id, 'version': version}, backend.api_secret,
+        cloudinary.config().signature_algorithm, signature_version=1,
+    )
+
+
+def verify_upload(upload, backend=None):
+    """
+    CloudinaryResource for one upload response (a dict with public_id,
+    version, format and signature). Raises InvalidUpload if it wasn't made
+    with our parameters.
+    """
+    try:
+        public_id, version, signature = upload['public_id'], str(upload['version']), upload['signature']
+    except (KeyError, TypeError):
+        raise InvalidUpload("Each upload needs public_id, version and signature")
+    if not str(public_id).startswith(_config().get('folder', 'cars/images') + '/'):
+        raise InvalidUpload(f"'{public_id}' is not in the upload folder")
+    if not hmac.compare_digest(str(signature), response_signature(public_id, version, backend)):
+        raise InvalidUpload(f"Invalid signature for '{public_id}'")
+    return CloudinaryResource(
+        public_id, format=upload.get('format'), version=version, type='upload', resource_type='image'
+    )
+
+
+def _check_unused(resources):
+    """Raises InvalidUpload if an upload is repeated or already attached to a car."""
+    public_ids = [resource.public_id for resource in resources]
+    attached = [public_id for public_id in public_ids if public_ids.count(public_id) > 1]
+    for model, field in ((Car, 'main_image'), (CarImage, 'image')):
+        if attached or not public_ids:
+            break
+        # Stored as "image/upload/v<version>/<public_id>.<format>".
+        stored = {
+            resource.public_id for resource in model.objects.filter(
+                reduce(or_, (Q(**{f'{field}__contains': f'/{public_id}'}) for public_id in public_ids))
+            ).values_list(field, flat=True)
+        }
+        attached = [public_id for public_id in public_ids if public_id in stored]
+    if attached:
+        raise InvalidUpload(f"'{attached[0]}' is already attached")
+
+
+def finalize(main_image=None, gallery_images=(), car=None, car_data=None, backend=None):
+    """
+    Attach verified uploads to `car`, or to a new car created from
+    `car_data` (a validated CarCreateSerializer), in one transaction.
+    Returns the car.
+    """
+    main_resource = verify_upload(main_image, backend) if main_image else None
+    gallery = [(verify_upload(upload, backend), upload.get('caption', '')) for upload in gallery_images]
+
+    with transaction.atomic():
+        _check_unused(([main_resource] if main_resource else []) + [resource for resource, _ in gallery])
+        if car is None:
+            car = car_data.save(**({'main_image': main_resource} if main_resource else {}))
+        else:
+            car = Car.objects.select_for_update().get(pk=car.pk)
+            if main_resource:
+                car.main_image = main_resource
+                car.save()
+        for resource, caption in gallery:
+            CarImage.objects.create(car=car, image=resource, caption=caption or f"Gallery image for {car.title}")
+    return car
+
+
+def verify_local_upload(fields):
+    """Checks a form post to the local stand-in like Cloudinary would."""
+    backend = LocalUploads()
+    params = {key: fields.get(key) for key in ('public_id', 'timestamp', 'allowed_formats')}
+    api_key, signature = str(fields.get('api_key', '')), str(fields.get('signature', ''))
+    if not (hmac.compare_digest(api_key, backend.api_key)
+            and hmac.compare_digest(signature, _sign(params, backend.api_secret))):
+        raise InvalidUpload("Invalid signature")
+    try:
+        age = time.time() - int(params['timestamp'])
+    except (TypeError, ValueError):
+        raise InvalidUpload("Invalid timestamp")
+    if age > SIGNATURE_MAX_AGE:
+        raise InvalidUpload("Signature expired")
+    return params
+
+
+def store_local(fields, upload):
+    """Stores a file posted to the stand-in and returns a Cloudinary-style response."""
+    params = verify_local_upload(fields)
+    extension = Path(upload.name).suffix.lstrip('.').lower()
+    if extension not in params['allowed_formats'].split(','):
+        raise InvalidUpload(f"Format '{extension}' is not allowed")
+
+    storage = LocalUploads().storage()
+    name = f"{params['public_id']}.{extension}"
+    if storage.exists(name):
+        # public_ids are single use, like Cloudinary without overwrite.
+        raise InvalidUpload(f"'{params['public_id']}' was already uploaded")
+    storage.save(name, upload)
+    version = int(time.time())
+    return {
+        'public_id': params['public_id'],
+        'version': version,
+        'format': extension,
+        'bytes': upload.size,
+        'signature': response_signature(params['public_id'], version, LocalUploads()),
+    }
@@ -2,16 +2,29 @@ from django.urls import path
 from . import views
 from rest_framework_simplejwt.views import TokenRefreshView
 urlpatterns = [
+    path('home/', views.HomeView.as_view(), name='home'),
     path('cars/', views.CarListView.as_view(), name='car-list'),
     path('cars/recent/', views.RecentCarsView.as_view(), name='recent-cars'),
     path('cars/featured/', views.FeaturedCarsView.as_view(), name='featured-cars'),
+    path('cars/trending/', views.TrendingCarsView.as_view(), name='trending-cars'),
+    path('cars/facets/', views.CarFacetsView.as_view(), name='car-facets'),
+    path('cars/changes/', views.CarChangesView.as_view(), name='car-changes'),
+    path('cars/batch/', views.CarBatchView.as_view(), name='car-batch'),
     path('cars/<slug:slug>/', views.CarDetailView.as_view(), name='car-detail'),
     path('cars/<slug:slug>/related/', views.RelatedCarsView.as_view(), name='related-cars'),
+    path('cars/<slug:slug>/valuation/', views.CarValuationView.as_view(), name='car-valuation'),
+    path('saved-searches/', views.SavedSearchListView.as_view(), name='saved-search-list'),
+    path('saved-searches/<int:pk>/', views.SavedSearchDetailView.as_view(), name='saved-search-detail'),
     path("auth/firebase-login/", views.firebase_login, name="firebase_login"),
     path('send-verification/', views.send_verification_email, name='send_verification_email'),
+    path('send-verification/<uuid:token>/', views.verification_email_status, name='verification_email_status'),
     path('admin/stats/', views.admin_stats_view, name='admin-stats'),
     path('admin/users/', views.admin_users_view, name='admin-users'),
+    path('admin/admission-stats/', views.admin_admission_stats_view, name='admin-admission-stats'),
     path('admin/add-car/', views.admin_add_car_view, name='admin-add-car'),
+    path('admin/uploads/sign/', views.admin_sign_uploads_view, name='admin-sign-uploads'),
+    path('admin/uploads/finalize/', views.admin_finalize_uploads_view, name='admin-finalize-uploads'),
+    path('uploads/local/', views.LocalUploadView.as_view(), name='local-upload'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('auth/profile/', views.profile, name='profile'),
     path("cars/<slug:slug>/related/", views.RelatedCarsView.as_view(), name="related-cars"),
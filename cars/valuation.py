@@ -0,0 +1,205 @@
+from functools import reduce
+from operator import or_
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Car, PendingValuation, PriceSegment
+
+# Where a listing's price sits among comparable available cars.
+#
+# Price distributions are precomputed in vectorized pandas batches and
+# stored as PriceSegment rows, from most to least specific:
+#
+#     0  make, model, condition, year +-1, mileage band +-1
+#     1  make, model, year +-1, mileage band +-1
+#     2  make, model, year +-1
+#     3  make, model
+#
+# "Nearby" windows are built by repeating each car once per neighbouring
+# year/mileage band before grouping, so a segment keyed on year Y holds the
+# cars from Y-1 to Y+1. A valuation is one indexed lookup of a car's (at most
+# four) segment keys, using the most specific one with enough comparables.
+# Car changes queue their make/model in PendingValuation and only those
+# segments are recomputed by `manage.py refresh_valuations`.
+
+QUANTILES = np.linspace(0, 1, 21)
+LEVELS = [
+    ('make', 'model', 'condition', 'year', 'mileage_band'),
+    ('make', 'model', 'year', 'mileage_band'),
+    ('make', 'model', 'year'),
+    ('make', 'model'),
+]
+
+
+def _config():
+    return getattr(settings, 'CARS_VALUATION', {})
+
+
+def normalize(value):
+    return str(value or '').strip().lower()
+
+
+def segment_key(level, values):
+    return f"{level}:" + '|'.join(str(value) for value in values)
+
+
+def load_frame(pairs=None):
+    """Available cars (optionally only these make/model pairs) as a DataFrame."""
+    cars = Car.objects.filter(is_available=True)
+    if pairs is not None:
+        if not pairs:
+            return pd.DataFrame(columns=['make', 'model', 'condition', 'year', 'mileage', 'price'])
+        # Model names are free text, so pairs are matched after normalizing below.
+        cars = cars.filter(make__in={make for make, _ in pairs})
+    rows = cars.values_list('make', 'model', 'condition', 'year', 'mileage', 'price')
+    df = pd.DataFrame.from_records(rows.iterator(chunk_size=5000), columns=['make', 'model', 'condition', 'year', 'mileage', 'price'])
+
+    for column in ('make', 'model', 'condition'):
+        # Categoricals make the repeated groupbys below cheap to factorize.
+        df[column] = df[column].astype(str).str.strip().str.lower().astype('category')
+    df['year'] = pd.to_numeric(df['year'], errors='coerce')
+    df['mileage'] = pd.to_numeric(df['mileage'], errors='coerce')
+    df['price'] = pd.to_numeric(df['price'], errors='coerce')
+    df = df.dropna(subset=['year', 'mileage', 'price'])
+    df['year'] = df['year'].astype(np.int64)
+    df['mileage_band'] = df['mileage'].astype(np.int64) // _config().get('mileage_band', 25000)
+    if pairs is not None:
+        wanted = pd.MultiIndex.from_tuples([(normalize(make), normalize(model)) for make, model in pairs])
+        df = df[pd.MultiIndex.from_frame(df[['make', 'model']]).isin(wanted)]
+    return df
+
+
+def _windowed(df, column, radius):
+    """Repeats every row once per offset in [-radius, radius] of `column`."""
+    offsets = np.arange(-radius, radius + 1)
+    out = df.iloc[np.repeat(np.arange(len(df)), len(offsets))].copy()
+    out[column] = out[column].to_numpy() + np.tile(offsets, len(df))
+    return out
+
+
+def compute_segments(df):
+    """PriceSegment instances (unsaved) for every group with enough comparables."""
+    min_count = _config().get('min_comparables', 5)
+    by_year = _windowed(df, 'year', _config().get('year_radius', 1))
+    by_year_mileage = _windowed(by_year, 'mileage_band', _config().get('mileage_radius', 1))
+    frames = [by_year_mileage, by_year_mileage, by_year, df]
+
+    segments = []
+    for level, (columns, frame) in enumerate(zip(LEVELS, frames)):
+        if frame.empty:
+            continue
+        sizes = frame.groupby(list(columns), sort=False, observed=True)['price'].transform('size')
+        frame = frame[sizes.to_numpy() >= min_count]
+        if frame.empty:
+            continue
+        grouped = frame.groupby(list(columns), sort=False, observed=True)['price']
+        counts = grouped.size()
+        table = grouped.quantile(QUANTILES).unstack().reindex(counts.index).round(2)
+        for values, count, quantiles in zip(counts.index, counts.to_numpy(), table.to_numpy()):
+            values = values if isinstance(values, tuple) else (values,)
+            segments.append(PriceSegment(
+                key=segment_key(level, values),
+                level=level,
+                make=values[0],
+                model=values[1],
+                count=int(count),
+                quantiles=quantiles.tolist(),
+            ))
+    return segments
+
+
+def refresh_all(batch_size=2000):
+    """Recompute every segment. Returns the number of segments written."""
+    with transaction.atomic():
+        # Claimed before the cars are read: a change committed after this
+        # queues a new row instead of folding into one deleted below.
+        PendingValuation.objects.all().delete()
+        segments = compute_segments(load_frame())
+        PriceSegment.objects.all().delete()
+        PriceSegment.objects.bulk_create(segments, batch_size=batch_size)
+    return len(segments)
+
+
+def refresh_pending(limit=None, batch_size=2000):
+    """
+    Recompute the segments of make/models changed since the last refresh.
+    Returns (make/models refreshed, segments written).
+    """
+    with transaction.atomic():
+        pending = list(
+            PendingValuation.objects.order_by('created_at')
+            .values_list('id', 'make', 'model')[:limit or _config().get('batch_pairs', 200)]
+        )
+        if not pending:
+            return 0, 0
+        # Claim the rows before reading the cars (see refresh_all), so
+        # mark_stale() during the refresh isn't absorbed and then lost.
+        PendingValuation.objects.filter(id__in=[pending_id for pending_id, _, _ in pending]).delete()
+        pairs = {(make, model) for _, make, model in pending}
+        segments = compute_segments(load_frame(pairs))
+        PriceSegment.objects.filter(reduce(or_, (Q(make=make, model=model) for make, model in pairs))).delete()
+        PriceSegment.objects.bulk_create(segments, batch_size=batch_size)
+    return len(pairs), len(segments)
+
+
+def mark_stale(make, model):
+    PendingValuation.objects.bulk_create(
+        [PendingValuation(make=normalize(make), model=normalize(model))], ignore_conflicts=True
+    )
+
+
+def car_segment_keys(car):
+    """A car's segment keys, most specific first."""
+    make, model, condition = normalize(car['make']), normalize(car['model']), normalize(car['condition'])
+    keys = []
+    try:
+        year = int(car['year'])
+    except (TypeError, ValueError):
+        year = None
+    if year is not None:
+        band = int(car['mileage']) // _config().get('mileage_band', 25000)
+        keys += [
+            segment_key(0, (make, model, condition, year, band)),
+            segment_key(1, (make, model, year, band)),
+            segment_key(2, (make, model, year)),
+        ]
+    keys.append(segment_key(3, (make, model)))
+    return keys
+
+
+def valuation(car):
+    """
+    Valuation of `car` (a dict with the Car fields used for segmenting and
+    its price), or None when no segment has enough comparables.
+    """
+    keys = car_segment_keys(car)
+    segments = {segment.key: segment for segment in PriceSegment.objects.filter(key__in=keys)}
+    segment = next((segments[key] for key in keys if key in segments), None)
+    if segment is None:
+        return None
+
+    quantiles = segment.quantiles
+    price = float(car['price'])
+    percentile = float(np.interp(price, quantiles, QUANTILES * 100))
+    if percentile < 25:
+        position = 'below_market'
+    elif percentile > 75:
+        position = 'above_market'
+    else:
+        position = 'typical'
+    return {
+        'percentile': round(percentile, 1),
+        'position': position,
+        'comparables': segment.count,
+        'segment': LEVELS[segment.level],
+        'p10': quantiles[2],
+        'p25': quantiles[5],
+        'median': quantiles[10],
+        'p75': quantiles[15],
+        'p90': quantiles[18],
+        'computed_at': segment.computed_at,
+    }
@@ -1,19 +1,25 @@
 from rest_framework import generics, status
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import user_passes_test
-from .models import Car, CarImage
-from .serializers import CarListSerializer, CarDetailSerializer, UserSerializer
+from .models import Car, CarImage, OutboundEmail
+from .serializers import CarListSerializer, CarDetailSerializer, SavedSearchSerializer, UserSerializer
+from .conditional import ConditionalGetMixin
+from .routers import ReplicaReadMixin
 from firebase_admin import auth as firebase_auth
 import json
+from django.http import Http404, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
+from . import admission, archive, changes, facets, home, outbox, popularity, uploads, valuation
 
 
-class CarListView(generics.ListAPIView):
+class CarListView(ReplicaReadMixin, ConditionalGetMixin, generics.ListAPIView):
     serializer_class = CarListSerializer
     permission_classes = [AllowAny]
     authentication_classes = []
@@ -21,7 +27,7 @@ class CarListView(generics.ListAPIView):
     def get_queryset(self):
         return Car.objects.filter(is_available=True)
 
-class RecentCarsView(generics.ListAPIView):
+class RecentCarsView(ReplicaReadMixin, ConditionalGetMixin, generics.ListAPIView):
     serializer_class = CarListSerializer
     permission_classes = [AllowAny]
     authentication_classes = []
@@ -29,7 +35,7 @@ class RecentCarsView(generics.ListAPIView):
     def get_queryset(self):
         return Car.objects.filter(is_available=True)[:8]
 
-class FeaturedCarsView(generics.ListAPIView):
+class FeaturedCarsView(ReplicaReadMixin, ConditionalGetMixin, generics.ListAPIView):
     serializer_class = CarListSerializer
     permission_classes = [AllowAny]
     authentication_classes = []
@@ -37,19 +43,49 @@ class FeaturedCarsView(generics.ListAPIView):
     def get_queryset(self):
         return Car.objects.filter(is_available=True, is_featured=True)
 
-class CarDetailView(generics.RetrieveAPIView):
+    def get_conditional_queryset(self):
+        return self.get_queryset()
+
+class CarDetailView(ReplicaReadMixin, ConditionalGetMixin, generics.RetrieveAPIView):
     serializer_class = CarDetailSerializer
     permission_classes = [AllowAny]
     authentication_classes = []
     lookup_field = 'slug'
+    track_removals = False
     
     def get_queryset(self):
         return Car.objects.filter(is_available=True)
 
-class RelatedCarsView(generics.ListAPIView):
+    def get_conditional_queryset(self):
+        return Car.objects.filter(is_available=True, slug=self.kwargs.get('slug'))
+
+    def get(self, request, *args, **kwargs):
+        try:
+            response = super().get(request, *args, **kwargs)
+        except Http404:
+            # Archived cars keep their old links resolvable.
+            archived = archive.archived_summary(kwargs.get('slug'))
+            if archived is None:
+                raise
+            return Response(archived, status=status.HTTP_410_GONE)
+        # Buffered; written in batches by cars/popularity.py. A 304 is a
+        # repeat visit too, but never loaded the car, so its id is looked up.
+        if response.status_code == status.HTTP_200_OK:
+            popularity.record_view(response.data['id'])
+        elif response.status_code == status.HTTP_304_NOT_MODIFIED:
+            car_id = self.get_conditional_queryset().values_list('id', flat=True).first()
+            if car_id is not None:
+                popularity.record_view(car_id)
+        return response
+
+class RelatedCarsView(ReplicaReadMixin, ConditionalGetMixin, generics.ListAPIView):
     serializer_class = CarListSerializer
     permission_classes = [AllowAny]
     authentication_classes = []
+
+    def get_conditional_queryset(self):
+        same_make = Car.objects.filter(slug=self.kwargs.get('slug')).values('make')
+        return Car.objects.filter(make__in=same_make, is_available=True)
     
     def get_queryset(self):
         car_slug = self.kwargs.get('slug')
@@ -62,7 +98,116 @@ class RelatedCarsView(generics.ListAPIView):
         except Car.DoesNotExist:
             return Car.objects.none()
 
+class CarValuationView(ReplicaReadMixin, APIView):
+    """Where a car's price sits among comparable listings (see cars/valuation.py)."""
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    def get(self, request, slug):
+        car = (
+            Car.objects.filter(slug=slug, is_available=True)
+            .values('slug', 'make', 'model', 'condition', 'year', 'mileage', 'price')
+            .first()
+        )
+        if car is None:
+            raise Http404
+        return Response({
+            'slug': car['slug'],
+            'price': str(car['price']),
+            'valuation': valuation.valuation(car),
+        })
+
+class TrendingCarsView(ReplicaReadMixin, APIView):
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    def get(self, request):
+        return Response(popularity.trending())
+
+class CarFacetsView(ReplicaReadMixin, APIView):
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    def get(self, request):
+        selection = facets.parse_selection(request.query_params)
+        return Response(facets.facet_counts(selection))
+
+class HomeView(ReplicaReadMixin, APIView):
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    def get(self, request):
+        return Response(home.home_payload())
+
+class CarChangesView(ReplicaReadMixin, APIView):
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    def get(self, request):
+        try:
+            return Response(changes.changes_since(request.query_params.get('since')))
+        except changes.InvalidToken:
+            return Response({'error': 'Invalid since token'}, status=status.HTTP_400_BAD_REQUEST)
+        except changes.TokenExpired:
+            return Response({'error': 'Token expired, fetch /cars/changes/ without since to resync'}, status=status.HTTP_410_GONE)
+
+class CarBatchView(ReplicaReadMixin, APIView):
+    """
+    Several cars in one round trip, for compare pages and watchlists:
+    GET /cars/batch/?slugs=a,b,c or POST {"slugs": [...]}.
+    """
+    permission_classes = [AllowAny]
+    authentication_classes = []
+    max_slugs = 24
+
+    def get(self, request):
+        return self._batch(request.query_params.get('slugs', '').split(','))
+
+    def post(self, request):
+        slugs = request.data.get('slugs') if hasattr(request.data, 'get') else None
+        if not isinstance(slugs, list):
+            return Response({'error': 'slugs must be a list'}, status=status.HTTP_400_BAD_REQUEST)
+        return self._batch(slugs)
+
+    def _batch(self, slugs):
+        slugs = list(dict.fromkeys(str(slug).strip() for slug in slugs if str(slug).strip()))
+        if not slugs:
+            return Response({'error': 'At least one slug is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(slugs) > self.max_slugs:
+            return Response({'error': f'At most {self.max_slugs} slugs per request'}, status=status.HTTP_400_BAD_REQUEST)
+
+        cars = {
+            car.slug: car
+            for car in Car.objects.filter(is_available=True, slug__in=slugs).prefetch_related('additional_images')
+        }
+        return Response({
+            'cars': CarDetailSerializer([cars[slug] for slug in slugs if slug in cars], many=True).data,
+            'missing': [slug for slug in slugs if slug not in cars],
+        })
+
+class SavedSearchListView(generics.ListCreateAPIView):
+    """The signed-in user's saved searches; alerts go to `email` (default: their account email)."""
+    serializer_class = SavedSearchSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return self.request.user.saved_searches.all()
+
+    def perform_create(self, serializer):
+        email = serializer.validated_data.get('email') or self.request.user.email
+        if not email:
+            raise ValidationError({'email': 'An email address is required for alerts'})
+        serializer.save(user=self.request.user, email=email)
+
+class SavedSearchDetailView(generics.RetrieveUpdateDestroyAPIView):
+    serializer_class = SavedSearchSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return self.request.user.saved_searches.all()
+
 @csrf_exempt
+@admission.admission_control('send_verification_email')
 def send_verification_email(request):
     if request.method != "POST":
         return JsonResponse({"success": False, "error": "Only POST allowed"}, status=405)
@@ -73,27 +218,36 @@ def send_verification_email(request):
         if not email:
             return JsonResponse({"success": False, "error": "Email is required"}, status=400)
 
-        action_code_settings = firebase_auth.ActionCodeSettings(
-            url="https://cheaprides.com/",   # your live frontend domain
-            handle_code_in_app=True
-        )
-
-        link = firebase_auth.generate_email_verification_link(email, action_code_settings)
+        # Link generation and SMTP happen in the send_outbox worker.
+        queued = outbox.enqueue_verification_email(email)
 
-        send_mail(
-            subject="Verify your email",
-            message=f"Click this link to verify your account: {link}",
-            from_email=None,  # uses EMAIL_HOST_USER
-            recipient_list=[email],
-            fail_silently=False,
-        )
-
-        return JsonResponse({"success": True, "message": "Verification email sent."})
+        return JsonResponse({
+            "success": True,
+            "message": "Verification email queued.",
+            "email_id": str(queued.token),
+        }, status=202)
 
     except Exception as e:
         return JsonResponse({"success": False, "error": str(e)}, status=500)
+
+
+def verification_email_status(request, token):
+    if request.method != "GET":
+        return JsonResponse({"success": False, "error": "Only GET allowed"}, status=405)
+
+    email = OutboundEmail.objects.filter(token=token).first()
+    if email is None:
+        return JsonResponse({"success": False, "error": "Not found"}, status=404)
+
+    return JsonResponse({
+        "success": True,
+        "status": email.status,
+        "attempts": email.attempts,
+        "sent_at": email.sent_at.isoformat() if email.sent_at else None,
+    })
     
         
+@admission.admission_control('firebase_login')
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def firebase_login(request):
@@ -180,6 +334,14 @@ def admin_users_view(request):
     users = User.objects.all().values('id', 'username', 'email', 'is_active', 'is_staff', 'date_joined', 'last_login')
     return Response(list(users))
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def admin_admission_stats_view(request):
+    if not (request.user.is_staff or request.user.is_superuser):
+        return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
+
+    return Response(admission.stats())
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def admin_add_car_view(request):
@@ -251,6 +413,80 @@ def admin_add_car_view(request):
     
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def admin_sign_uploads_view(request):
+    """Signed parameters for uploading images straight to storage."""
+    if not (request.user.is_staff or request.user.is_superuser):
+        return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
+
+    max_files = uploads._config().get('max_files', 20)
+    try:
+        count = int(request.data.get('count', 1))
+    except (TypeError, ValueError):
+        count = 0
+    if not 1 <= count <= max_files:
+        return Response({'error': f'count must be between 1 and {max_files}'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(uploads.signed_params(count, request))
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def admin_finalize_uploads_view(request):
+    """
+    Attach uploaded images to a car in one transaction: to `car_id` if
+    given, otherwise to a new car built from `car`.
+    """
+    if not (request.user.is_staff or request.user.is_superuser):
+        return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
+
+    main_image = request.data.get('main_image')
+    gallery_images = request.data.get('gallery_images') or []
+    if not isinstance(gallery_images, list):
+        return Response({'error': 'gallery_images must be a list'}, status=status.HTTP_400_BAD_REQUEST)
+
+    car, serializer = None, None
+    if request.data.get('car_id') is not None:
+        try:
+            car_id = int(request.data['car_id'])
+        except (TypeError, ValueError):
+            return Response({'error': 'car_id must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        car = Car.objects.filter(pk=car_id).first()
+        if car is None:
+            return Response({'error': 'Car not found'}, status=status.HTTP_404_NOT_FOUND)
+    else:
+        from .serializers import CarCreateSerializer
+        serializer = CarCreateSerializer(data={**(request.data.get('car') or {}), 'main_image': None})
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        car = uploads.finalize(main_image, gallery_images, car=car, car_data=serializer)
+    except uploads.InvalidUpload as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({
+        'car_id': car.id,
+        'slug': car.slug,
+        'images': car.additional_images.count(),
+    }, status=status.HTTP_201_CREATED if serializer else status.HTTP_200_OK)
+
+
+class LocalUploadView(APIView):
+    """Offline stand-in for Cloudinary's upload API (CARS_UPLOADS backend 'local')."""
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    def post(self, request):
+        if uploads.get_backend().name != 'local':
+            raise Http404
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': {'message': 'Missing file'}}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            return Response(uploads.store_local(request.data, upload))
+        except uploads.InvalidUpload as e:
+            return Response({'error': {'message': str(e)}}, status=status.HTTP_400_BAD_REQUEST)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def profile(request):
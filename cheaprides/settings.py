@@ -64,11 +64,12 @@ CSRF_COOKIE_SECURE = not DEBUG
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware', 
+    'cars.snapshots.SnapshotWhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'cars.routers.ReplicaPinningMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -110,6 +111,40 @@ DATABASES = {
         )
     }
 
+# Optional read replica for the public catalogue views (see cars/routers.py).
+# Without DATABASE_REPLICA_URL every query goes to 'default'.
+if os.getenv("DATABASE_REPLICA_URL"):
+    DATABASES['replica'] = dj_database_url.config(
+        env="DATABASE_REPLICA_URL",
+        conn_max_age=600,
+        ssl_require=True
+    )
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['cars.routers.ReplicaRouter']
+
+# Shared cache for inventory-versioned data and admission control. Set
+# REDIS_URL (uses the `redis` package) whenever more than one gunicorn worker
+# or process serves requests: with the per-process LocMem fallback, a write
+# only bumps the inventory version in the worker that handled it, and the
+# others keep serving cached facets and /home/ until their entries expire.
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv("REDIS_URL"),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# How long a staff client's reads stay on the primary after it writes.
+REPLICA_PIN_SECONDS = 15
+
 
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -200,3 +235,109 @@ CSRF_TRUSTED_ORIGINS = [
 
 ]
 
+
+# Cache-Control policies for the public car endpoints, keyed by URL name.
+# '*' applies to any conditional-GET route without its own entry.
+CARS_CACHE_CONTROL = {
+    '*': {'public': True, 'max_age': 60},
+    'car-list': {'public': True, 'max_age': 60, 'stale_while_revalidate': 300},
+    'car-detail': {'public': True, 'max_age': 300, 'stale_while_revalidate': 600},
+    'featured-cars': {'public': True, 'max_age': 120},
+    'recent-cars': {'public': True, 'max_age': 60},
+    'related-cars': {'public': True, 'max_age': 300},
+}
+
+# Admission control for the slow unauthenticated endpoints (see cars/admission.py).
+# Limits are shared between gunicorn workers through CACHES; 'memory' is only
+# meaningful for a single threaded process such as runserver.
+CARS_ADMISSION = {
+    'backend': config('CARS_ADMISSION_BACKEND', default='cache'),
+    'cache_alias': 'default',
+    'routes': {
+        'firebase_login': {'rate': 5, 'burst': 20, 'concurrency': 4},
+        'send_verification_email': {'rate': 1, 'burst': 5, 'concurrency': 2, 'retry_after': 5},
+    },
+}
+
+# Transactional email outbox, drained by `manage.py send_outbox --loop`.
+CARS_OUTBOX = {
+    'batch_size': 50,
+    'max_attempts': 5,
+    'backoff_seconds': 30,
+    'verification_url': 'https://cheaprides.com/',
+}
+
+# Static JSON snapshots of the catalogue (see cars/snapshots.py). Rebuilt in
+# full by `manage.py build_snapshots`, incrementally after inventory changes.
+CARS_SNAPSHOTS = {
+    'enabled': config('CARS_SNAPSHOTS_ENABLED', default=True, cast=bool),
+    'root': os.path.join(BASE_DIR, "snapshots"),
+    'url': '/snapshots/',
+    'debounce_seconds': 2.0,
+    'max_age': 60,
+}
+
+# Incremental change feed at /api/cars/changes/?since=<token>.
+CARS_CHANGE_FEED = {
+    'limit': 500,
+    'grace_seconds': 5,
+    'tombstone_retention_days': 30,
+}
+
+# Archival of long-unavailable cars; run `manage.py archive_cars` on a schedule
+# (e.g. a daily cron job).
+CARS_ARCHIVE = {
+    'after_days': 90,
+    'batch_size': 500,
+}
+
+# Saved-search alerts, matched by `manage.py match_saved_searches --loop` and
+# delivered through the outbox.
+CARS_SAVED_SEARCHES = {
+    'batch_size': 200,
+    'car_url': 'https://cheapridesgh.com/cars/{slug}',
+}
+
+# Market-price valuation segments (see cars/valuation.py), refreshed by
+# `manage.py refresh_valuations --loop` and in full on deploy.
+CARS_VALUATION = {
+    'year_radius': 1,
+    'mileage_band': 25000,
+    'mileage_radius': 1,
+    'min_comparables': 5,
+    'batch_pairs': 200,
+}
+
+# Duplicate-listing detection (see cars/duplicates.py), run by
+# `manage.py find_duplicates --loop`; candidates are reviewed in the admin.
+CARS_DUPLICATES = {
+    'workers': 4,
+    'batch_size': 200,
+    'text_threshold': 0.6,
+    'image_distance': 5,
+    'max_bucket': 1000,
+    'max_images': 4,
+    'image_timeout': 5,
+}
+
+# Buffered detail-page view counts and /cars/trending/ (see cars/popularity.py).
+# Set CARS_POPULARITY_BACKEND=cache to combine counts from all gunicorn workers.
+CARS_POPULARITY = {
+    'backend': config('CARS_POPULARITY_BACKEND', default='memory'),
+    'cache_alias': 'default',
+    'flush_seconds': 10,
+    'max_pending': 500,
+    'half_life_hours': 24,
+    'trending_limit': 12,
+    'cache_seconds': 60,
+}
+
+# Signed direct-to-storage image uploads (see cars/uploads.py). The 'local'
+# backend stores files under local_root for offline testing.
+CARS_UPLOADS = {
+    'backend': config('CARS_UPLOADS_BACKEND', default='cloudinary'),
+    'folder': 'cars/images',
+    'allowed_formats': 'jpg,jpeg,png,webp',
+    'max_files': 20,
+    'local_root': BASE_DIR / 'local_uploads',
+}